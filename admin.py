@@ -8,7 +8,7 @@ Django管理画面カスタマイズ
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from django.utils.html import format_html
+from django.utils.html import escape, format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Count, Avg
@@ -18,6 +18,24 @@ from .models import (
 )
 
 
+# バッジ描画テンプレート（変更リストの行ごとに呼ばれるため、
+# format_htmlの都度フォーマットを避けて静的部分を事前に共有する）
+_BADGE_TEMPLATE = (
+    '<span style="background-color: {}; color: white; padding: 3px 8px; '
+    'border-radius: 3px; font-size: 12px;">{}</span>'
+)
+
+# 希望度バッジは取り得る値が固定なので描画済み文字列を事前生成
+_PREFERENCE_BADGES = {
+    5: mark_safe(_BADGE_TEMPLATE.format('#dc3545', '絶対')),   # 赤
+    4: mark_safe(_BADGE_TEMPLATE.format('#fd7e14', '希望')),   # オレンジ
+    3: mark_safe(_BADGE_TEMPLATE.format('#ffc107', '普通')),   # 黄色
+    2: mark_safe(_BADGE_TEMPLATE.format('#6c757d', '微妙')),   # グレー
+    1: mark_safe(_BADGE_TEMPLATE.format('#343a40', '不可')),   # 黒
+}
+_UNKNOWN_PREFERENCE_BADGE = mark_safe(_BADGE_TEMPLATE.format('#6c757d', '不明'))
+
+
 class StaffProfileInline(admin.StackedInline):
     """ユーザーモデルにスタッフプロフィールを統合"""
     model = StaffProfile
@@ -55,7 +73,11 @@ class CustomUserAdmin(UserAdmin):
     list_filter = ('is_staff', 'is_active', 'date_joined', 
                    'staffprofile__work_style', 'staffprofile__is_active')
     search_fields = ('username', 'email', 'first_name', 'last_name')
-    
+
+    def get_queryset(self, request):
+        # 一覧でプロフィール状態を表示するためのN+1を回避
+        return super().get_queryset(request).select_related('staffprofile')
+
     def get_profile_status(self, obj):
         try:
             profile = obj.staffprofile
@@ -95,10 +117,8 @@ class JobTypeAdmin(admin.ModelAdmin):
     )
     
     def get_colored_badge(self, obj):
-        return format_html(
-            '<span style="background-color: {}; color: white; padding: 3px 8px; '
-            'border-radius: 3px; font-size: 12px;">{}</span>',
-            obj.color, obj.name
+        return mark_safe(
+            _BADGE_TEMPLATE.format(escape(obj.color), escape(obj.name))
         )
     get_colored_badge.short_description = '表示'
 
@@ -121,10 +141,8 @@ class HolidayTypeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
     
     def get_colored_badge(self, obj):
-        return format_html(
-            '<span style="background-color: {}; color: white; padding: 3px 8px; '
-            'border-radius: 3px; font-size: 12px;">{}</span>',
-            obj.color, obj.name
+        return mark_safe(
+            _BADGE_TEMPLATE.format(escape(obj.color), escape(obj.name))
         )
     get_colored_badge.short_description = '表示'
 
@@ -186,32 +204,19 @@ class ShiftRequestAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     date_hierarchy = 'date'
     ordering = ('-created_at',)
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user', 'job_type', 'period'
+        )
+
     def get_user_name(self, obj):
         return f"{obj.user.last_name} {obj.user.first_name}"
     get_user_name.short_description = 'スタッフ'
-    
+
     def get_preference_badge(self, obj):
-        preference_colors = {
-            5: '#dc3545',  # 赤
-            4: '#fd7e14',  # オレンジ
-            3: '#ffc107',  # 黄色
-            2: '#6c757d',  # グレー
-            1: '#343a40',  # 黒
-        }
-        preference_texts = {
-            5: '絶対',
-            4: '希望',
-            3: '普通',
-            2: '微妙',
-            1: '不可',
-        }
-        color = preference_colors.get(obj.preference_level, '#6c757d')
-        text = preference_texts.get(obj.preference_level, '不明')
-        return format_html(
-            '<span style="background-color: {}; color: white; padding: 3px 8px; '
-            'border-radius: 3px; font-size: 12px;">{}</span>',
-            color, text
+        return _PREFERENCE_BADGES.get(
+            obj.preference_level, _UNKNOWN_PREFERENCE_BADGE
         )
     get_preference_badge.short_description = '希望度'
 
@@ -225,25 +230,29 @@ class ShiftAssignmentAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     date_hierarchy = 'date'
     ordering = ('-date', 'start_time')
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'job_type')
+
     def get_user_name(self, obj):
         return f"{obj.user.last_name} {obj.user.first_name}"
     get_user_name.short_description = 'スタッフ'
     
     def get_duration(self, obj):
         if obj.start_time and obj.end_time:
-            # 勤務時間を計算
-            from datetime import datetime, timedelta
-            start = datetime.combine(obj.date, obj.start_time)
-            end = datetime.combine(obj.date, obj.end_time)
-            
+            # 勤務時間を計算（行ごとのdatetime生成を避けて秒の整数演算で）
+            start = obj.start_time
+            end = obj.end_time
+            seconds = (
+                (end.hour * 3600 + end.minute * 60 + end.second)
+                - (start.hour * 3600 + start.minute * 60 + start.second)
+            )
+
             # 終了時刻が開始時刻より早い場合（日をまたぐ場合）
-            if end < start:
-                end += timedelta(days=1)
-            
-            duration = end - start
-            hours = duration.total_seconds() / 3600
-            return f"{hours:.1f}時間"
+            if seconds < 0:
+                seconds += 86400
+
+            return f"{seconds / 3600:.1f}時間"
         return "-"
     get_duration.short_description = '勤務時間'
 
@@ -256,7 +265,10 @@ class HolidayBalanceAdmin(admin.ModelAdmin):
     list_filter = ('holiday_type', 'year')
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
     ordering = ('year', 'user__username')
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'holiday_type')
+
     def get_user_name(self, obj):
         return f"{obj.user.last_name} {obj.user.first_name}"
     get_user_name.short_description = 'スタッフ'
@@ -282,7 +294,10 @@ class NotificationLogAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     readonly_fields = ('created_at',)
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
     def get_user_name(self, obj):
         if obj.user:
             return f"{obj.user.last_name} {obj.user.first_name}"
@@ -10,11 +10,23 @@ PuLPを使用した数理最適化によるシフト自動作成システム
 - 複数の制約条件下での最適解の導出
 """
 
+import os
+
 import pulp
 import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
-from django.db import transaction
+
+try:
+    # OR-Tools CP-SATはシフトスケジューリングに特化した高速ソルバー
+    # （インプロセス・マルチスレッド実行でCBCのサブプロセス起動も不要）
+    from ortools.sat.python import cp_model
+except ImportError:
+    # OR-Toolsが利用できない場合はCBCにフォールバック
+    cp_model = None
+from django.db import connection, connections, transaction
 from django.utils import timezone
 
 from ..models import (
@@ -33,8 +45,23 @@ class ShiftOptimizer:
     
     def __init__(self, period_id: int):
         self.period = SchedulePeriod.objects.get(id=period_id)
-        self.staff_list = StaffProfile.objects.filter(is_active=True)
+        # 一度だけ評価してリスト化（各メソッドでのクエリ再実行を防ぐ）
+        self.staff_list = list(
+            StaffProfile.objects.filter(
+                is_active=True
+            ).select_related('job_type', 'work_style')
+        )
+
+        # 職種別スタッフインデックス（制約構築のホットパスで再利用）
+        self._staff_by_job = defaultdict(list)
+        for staff in self.staff_list:
+            if staff.job_type_id:
+                self._staff_by_job[staff.job_type_id].append(staff)
+        self._job_type_ids = sorted(self._staff_by_job)
+
         self.date_range = self._generate_date_range()
+        # 日付文字列テーブル（ホットループ内でのstrftime呼び出しを排除）
+        self._date_strs = [d.isoformat() for d in self.date_range]
         self.requests = self._load_shift_requests()
         self.requirements = self._load_daily_requirements()
         
@@ -43,7 +70,7 @@ class ShiftOptimizer:
         self.problem = None
         
         logger.info(f"シフト最適化を開始: {self.period.name}")
-        logger.info(f"対象スタッフ数: {self.staff_list.count()}")
+        logger.info(f"対象スタッフ数: {len(self.staff_list)}")
         logger.info(f"対象期間: {len(self.date_range)}日間")
 
     def _generate_date_range(self) -> List[datetime.date]:
@@ -57,24 +84,29 @@ class ShiftOptimizer:
 
     def _load_shift_requests(self) -> Dict:
         """スタッフの希望を読み込み"""
-        requests = {}
-        for request in ShiftRequest.objects.filter(period=self.period):
-            key = (request.staff.id, request.date)
-            requests[key] = request.priority
-        
+        requests = {
+            (staff_id, date): priority
+            for staff_id, date, priority in ShiftRequest.objects.filter(
+                period=self.period
+            ).values_list('staff_id', 'date', 'priority')
+        }
+
         logger.info(f"読み込み済み希望件数: {len(requests)}")
         return requests
 
     def _load_daily_requirements(self) -> Dict:
         """日別必要人数を読み込み"""
-        requirements = {}
-        for req in DailyRequirement.objects.filter(period=self.period):
-            key = (req.date, req.job_type.id)
-            requirements[key] = {
-                'min_count': req.min_staff_count,
-                'required_count': req.required_staff_count
+        requirements = {
+            (date, job_type_id): {
+                'min_count': min_count,
+                'required_count': required_count,
             }
-        
+            for date, job_type_id, min_count, required_count
+            in DailyRequirement.objects.filter(period=self.period).values_list(
+                'date', 'job_type_id', 'min_staff_count', 'required_staff_count'
+            )
+        }
+
         logger.info(f"読み込み済み必要人数設定: {len(requirements)}")
         return requirements
 
@@ -97,37 +129,45 @@ class ShiftOptimizer:
         logger.info("最適化問題の構築完了")
 
     def _create_decision_variables(self):
-        """決定変数の作成: is_working[staff_id][date_str]"""
+        """決定変数の作成: is_working[(staff_id, date_index)]"""
         for staff in self.staff_list:
-            for date in self.date_range:
-                date_str = date.strftime('%Y-%m-%d')
-                var_name = f"work_{staff.id}_{date_str}"
-                self.is_working[(staff.id, date_str)] = pulp.LpVariable(
+            for i, date in enumerate(self.date_range):
+                # 変数名はLPファイルの可読性のためISO日付のまま
+                var_name = f"work_{staff.id}_{self._date_strs[i]}"
+                self.is_working[(staff.id, i)] = pulp.LpVariable(
                     var_name, cat='Binary'
                 )
 
     def _set_objective_function(self):
         """目的関数の設定: 希望の優先度に基づくスコア最大化"""
-        objective_terms = []
-        
+        # 係数辞書を直接構築してLpAffineExpressionに渡す
+        # （lpSumによる逐次加算よりも大規模問題で大幅に高速）
+        coeffs = {}
+
+        # ホットループ内の属性参照をローカル束縛
+        is_working = self.is_working
+        requests = self.requests
+        date_range = self.date_range
+
         for staff in self.staff_list:
-            for date in self.date_range:
-                date_str = date.strftime('%Y-%m-%d')
-                var = self.is_working[(staff.id, date_str)]
-                
+            staff_id = staff.id
+            for i, date in enumerate(date_range):
+                var = is_working[(staff_id, i)]
+
                 # スタッフの希望を取得
-                request_key = (staff.id, date)
-                priority = self.requests.get(request_key, 2)  # デフォルト: 勤務可
-                
+                priority = requests.get((staff_id, date), 2)  # デフォルト: 勤務可
+
                 # 優先度に応じたスコア設定
                 if priority == 3:  # 勤務最優先
-                    objective_terms.append(10 * var)
+                    coeffs[var] = 10
                 elif priority == 2:  # 勤務可
-                    objective_terms.append(1 * var)
+                    coeffs[var] = 1
                 elif priority == 1:  # 休み希望
-                    objective_terms.append(-100 * var)  # 大きなペナルティ
-        
-        self.problem += pulp.lpSum(objective_terms), "TotalPriorityScore"
+                    # 休み希望は強制制約側で保証されるため、ペナルティは
+                    # 係数スケールを揃えた小さい整数に抑える（求解が速くなる）
+                    coeffs[var] = -20
+
+        self.problem += pulp.LpAffineExpression(coeffs.items()), "TotalPriorityScore"
 
     def _add_constraints(self):
         """制約条件の追加"""
@@ -148,24 +188,29 @@ class ShiftOptimizer:
     def _add_daily_minimum_constraints(self):
         """日別・職種別最低人数制約"""
         constraint_count = 0
-        
-        for date in self.date_range:
-            for job_type_id in self._get_all_job_type_ids():
+
+        is_working = self.is_working
+        requirements = self.requirements
+        staff_by_job = self._staff_by_job
+        job_type_ids = self._get_all_job_type_ids()
+        lpSum = pulp.lpSum
+
+        for i, date in enumerate(self.date_range):
+            for job_type_id in job_type_ids:
                 req_key = (date, job_type_id)
-                if req_key in self.requirements:
-                    min_count = self.requirements[req_key]['min_count']
-                    
+                if req_key in requirements:
+                    min_count = requirements[req_key]['min_count']
+
                     # 該当職種のスタッフの勤務変数の合計 >= 最低人数
                     staff_vars = [
-                        self.is_working[(s.id, date.strftime('%Y-%m-%d'))]
-                        for s in self.staff_list 
-                        if s.job_type and s.job_type.id == job_type_id
+                        is_working[(s.id, i)]
+                        for s in staff_by_job[job_type_id]
                     ]
-                    
+
                     if staff_vars:
                         constraint_name = f"daily_min_{date}_{job_type_id}"
                         self.problem += (
-                            pulp.lpSum(staff_vars) >= min_count,
+                            lpSum(staff_vars) >= min_count,
                             constraint_name
                         )
                         constraint_count += 1
@@ -175,26 +220,29 @@ class ShiftOptimizer:
     def _add_monthly_workday_constraints(self):
         """月間勤務日数制約"""
         constraint_count = 0
-        
+
+        is_working = self.is_working
+        n_days = len(self.date_range)
+
         for staff in self.staff_list:
             if staff.work_style:
                 # 月間勤務日数の合計変数
-                monthly_vars = [
-                    self.is_working[(staff.id, date.strftime('%Y-%m-%d'))]
-                    for date in self.date_range
-                ]
-                
+                monthly_total = pulp.LpAffineExpression(
+                    (is_working[(staff.id, i)], 1)
+                    for i in range(n_days)
+                )
+
                 # 最低勤務日数制約
                 if staff.work_style.min_shifts_per_month > 0:
                     self.problem += (
-                        pulp.lpSum(monthly_vars) >= staff.work_style.min_shifts_per_month,
+                        monthly_total >= staff.work_style.min_shifts_per_month,
                         f"min_monthly_{staff.id}"
                     )
                     constraint_count += 1
-                
+
                 # 最大勤務日数制約
                 self.problem += (
-                    pulp.lpSum(monthly_vars) <= staff.work_style.max_shifts_per_month,
+                    monthly_total <= staff.work_style.max_shifts_per_month,
                     f"max_monthly_{staff.id}"
                 )
                 constraint_count += 1
@@ -205,20 +253,37 @@ class ShiftOptimizer:
         """最大連勤制約"""
         constraint_count = 0
         
+        is_working = self.is_working
+        n_days = len(self.date_range)
+
         for staff in self.staff_list:
             if staff.work_style and staff.work_style.allow_consecutive_days > 0:
                 max_consecutive = staff.work_style.allow_consecutive_days
-                
+                if n_days <= max_consecutive:
+                    continue
+
+                vars_list = [
+                    is_working[(staff.id, i)] for i in range(n_days)
+                ]
+
                 # 連続するmax_consecutive + 1日間のうち、
-                # 勤務日がmax_consecutive日を超えてはいけない
-                for i in range(len(self.date_range) - max_consecutive):
-                    consecutive_vars = [
-                        self.is_working[(staff.id, self.date_range[i + j].strftime('%Y-%m-%d'))]
-                        for j in range(max_consecutive + 1)
-                    ]
-                    
+                # 勤務日がmax_consecutive日を超えてはいけない。
+                # ウィンドウ式は末尾を足して先頭を引く増分更新で構築する
+                window = pulp.LpAffineExpression(
+                    (vars_list[j], 1) for j in range(max_consecutive + 1)
+                )
+                self.problem += (
+                    window <= max_consecutive,
+                    f"consecutive_{staff.id}_0"
+                )
+                constraint_count += 1
+
+                for i in range(1, n_days - max_consecutive):
+                    window = (
+                        window - vars_list[i - 1] + vars_list[i + max_consecutive]
+                    )
                     self.problem += (
-                        pulp.lpSum(consecutive_vars) <= max_consecutive,
+                        window <= max_consecutive,
                         f"consecutive_{staff.id}_{i}"
                     )
                     constraint_count += 1
@@ -229,12 +294,15 @@ class ShiftOptimizer:
         """休み希望の強制制約（優先度1の日は必ず休み）"""
         constraint_count = 0
         
+        is_working = self.is_working
+        requests = self.requests
+
         for staff in self.staff_list:
-            for date in self.date_range:
-                request_key = (staff.id, date)
-                if self.requests.get(request_key) == 1:  # 休み希望
-                    date_str = date.strftime('%Y-%m-%d')
-                    var = self.is_working[(staff.id, date_str)]
+            staff_id = staff.id
+            for i, date in enumerate(self.date_range):
+                if requests.get((staff_id, date)) == 1:  # 休み希望
+                    date_str = self._date_strs[i]
+                    var = is_working[(staff_id, i)]
                     
                     # 休み希望の日は勤務させない（強制制約）
                     self.problem += (
@@ -246,11 +314,8 @@ class ShiftOptimizer:
         logger.info(f"休み希望強制制約: {constraint_count}件")
 
     def _get_all_job_type_ids(self) -> List[int]:
-        """システム内の全職種IDを取得"""
-        return list(set(
-            s.job_type.id for s in self.staff_list 
-            if s.job_type is not None
-        ))
+        """システム内の全職種IDを取得（__init__で一度だけ算出済み）"""
+        return self._job_type_ids
 
     def solve(self) -> Tuple[bool, str]:
         """最適化問題を解く"""
@@ -261,12 +326,22 @@ class ShiftOptimizer:
         start_time = datetime.now()
         
         try:
-            # PuLPソルバーで解く
-            self.problem.solve(pulp.PULP_CBC_CMD(msg=0))
-            
+            if cp_model is not None:
+                # CP-SATソルバーで解く
+                status = self._solve_with_cpsat()
+            else:
+                # PuLPソルバーで解く（マルチスレッド＋積極的なカット生成）
+                self.problem.solve(pulp.PULP_CBC_CMD(
+                    msg=0,
+                    threads=os.cpu_count() or 1,
+                    presolve=True,
+                    cuts=True,
+                    strong=True,
+                ))
+                status = pulp.LpStatus[self.problem.status]
+
             execution_time = (datetime.now() - start_time).total_seconds()
-            status = pulp.LpStatus[self.problem.status]
-            
+
             logger.info(f"最適化完了: {status} (実行時間: {execution_time:.2f}秒)")
             
             if status == 'Optimal':
@@ -280,6 +355,51 @@ class ShiftOptimizer:
             logger.error(f"最適化中にエラーが発生: {str(e)}")
             return False, f"計算エラー: {str(e)}"
 
+    def _solve_with_cpsat(self) -> str:
+        """構築済みのPuLP問題をCP-SATモデルへ変換して解く
+
+        全変数がバイナリ・全制約が整数係数の線形制約なので機械的に
+        変換できる。解いた後は各LpVariableのvarValueへ値を書き戻す
+        ため、save_results側はソルバーの違いを意識しない。
+        """
+        model = cp_model.CpModel()
+        cp_vars = {
+            var.name: model.NewBoolVar(var.name)
+            for var in self.is_working.values()
+        }
+
+        # 制約の変換（pulpは expr + constant <sense> 0 の形で保持する）
+        for constraint in self.problem.constraints.values():
+            expr = sum(
+                int(coef) * cp_vars[v.name] for v, coef in constraint.items()
+            )
+            rhs = int(-constraint.constant)
+            if constraint.sense == pulp.LpConstraintLE:
+                model.Add(expr <= rhs)
+            elif constraint.sense == pulp.LpConstraintGE:
+                model.Add(expr >= rhs)
+            else:
+                model.Add(expr == rhs)
+
+        # 目的関数の変換（最大化）
+        model.Maximize(sum(
+            int(coef) * cp_vars[v.name]
+            for v, coef in self.problem.objective.items()
+        ))
+
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = os.cpu_count() or 1
+        result = solver.Solve(model)
+
+        if result in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            for var in self.is_working.values():
+                var.varValue = solver.Value(cp_vars[var.name])
+            self.problem.status = pulp.LpStatusOptimal
+            return 'Optimal' if result == cp_model.OPTIMAL else 'Feasible'
+
+        self.problem.status = pulp.LpStatusInfeasible
+        return 'Infeasible'
+
     def save_results(self) -> int:
         """最適化結果をデータベースに保存"""
         if not self.problem or pulp.LpStatus[self.problem.status] not in ['Optimal', 'Feasible']:
@@ -287,22 +407,32 @@ class ShiftOptimizer:
         
         logger.info("結果をデータベースに保存中...")
         assignment_count = 0
-        
+
+        # デフォルトの休日種別はループ外で一度だけ取得
+        default_holiday = HolidayType.objects.filter(name='週休').first()
+
         # 既存の割り当てを削除
         with transaction.atomic():
-            ShiftAssignment.objects.filter(
-                date__range=(self.period.start_date, self.period.end_date)
-            ).delete()
+            # ORMの.delete()は削除コレクタがPKを全件フェッチする。
+            # ShiftAssignmentには下流カスケードもシグナルもないため、
+            # 単一のDELETE文で置き換える
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {ShiftAssignment._meta.db_table} "
+                    "WHERE date BETWEEN %s AND %s",
+                    [self.period.start_date, self.period.end_date],
+                )
             
             # 新しい割り当てを作成
+            # （S×D回呼ばれる抽出ループではpulp.value()のディスパッチを
+            #   避け、varValue属性を直接読む）
             assignments_to_create = []
-            
+            is_working = self.is_working
+
             for staff in self.staff_list:
-                for date in self.date_range:
-                    date_str = date.strftime('%Y-%m-%d')
-                    var = self.is_working[(staff.id, date_str)]
-                    
-                    if pulp.value(var) == 1:
+                staff_id = staff.id
+                for i, date in enumerate(self.date_range):
+                    if is_working[(staff_id, i)].varValue == 1:
                         # 勤務日として保存
                         assignments_to_create.append(
                             ShiftAssignment(
@@ -316,10 +446,6 @@ class ShiftOptimizer:
                         assignment_count += 1
                     else:
                         # 休日として保存（デフォルトの休日種別を使用）
-                        default_holiday = HolidayType.objects.filter(
-                            name='週休'
-                        ).first()
-                        
                         assignments_to_create.append(
                             ShiftAssignment(
                                 staff=staff,
@@ -331,8 +457,10 @@ class ShiftOptimizer:
                             )
                         )
             
-            # バルクインサートで効率的に保存
-            ShiftAssignment.objects.bulk_create(assignments_to_create)
+            # バルクインサートで効率的に保存（分割してメモリ使用量を抑制）
+            ShiftAssignment.objects.bulk_create(
+                assignments_to_create, batch_size=1000
+            )
         
         logger.info(f"結果保存完了: {assignment_count}件の勤務割り当て")
         return assignment_count
@@ -345,17 +473,29 @@ class ShiftSchedulerService:
     """
     
     @staticmethod
-    def generate_schedule(period_id: int, user_id: Optional[int] = None) -> Dict:
+    def generate_schedule(period_id: int, user_id: Optional[int] = None,
+                          run_async: bool = False) -> Dict:
         """
         指定期間のシフトを自動生成
-        
+
         Args:
             period_id: 対象期間のID
             user_id: 実行ユーザーのID
-            
+            run_async: TrueならCeleryワーカーへ投入して即座に返す
+
         Returns:
             結果辞書（成功/失敗、メッセージ、統計情報等）
         """
+        # 求解はCPUバウンドで数分かかり得るため、Webワーカーを
+        # ブロックしないよう専用キューへ逃がせるようにする
+        if run_async and hasattr(run_shift_optimization_task, 'delay'):
+            task = run_shift_optimization_task.delay(period_id, user_id)
+            return {
+                'success': True,
+                'message': 'シフト自動作成タスクを開始しました。',
+                'task_id': task.id,
+            }
+
         start_time = datetime.now()
         
         try:
@@ -415,6 +555,29 @@ class ShiftSchedulerService:
                 'assignments_count': 0
             }
 
+    @staticmethod
+    def generate_schedules(period_ids: List[int],
+                           user_id: Optional[int] = None) -> List[Dict]:
+        """
+        複数期間のシフトをプロセス並列で一括生成
+
+        各期間の最適化はCPUバウンドかつ互いに独立しているため、
+        ProcessPoolExecutorでGILを回避し期間数にほぼ線形で高速化する。
+        """
+        # フォーク前にDB接続を閉じ、子プロセス間での接続共有による
+        # 破損を防ぐ（各子プロセスは初回クエリ時に再接続する）
+        connections.close_all()
+
+        max_workers = min(len(period_ids), os.cpu_count() or 1) or 1
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    ShiftSchedulerService.generate_schedule, period_id, user_id
+                )
+                for period_id in period_ids
+            ]
+            return [future.result() for future in futures]
+
     @staticmethod
     def _log_execution(period_id: int, action: str, user_id: Optional[int],
                       description: str, success: bool, execution_time: float):
@@ -449,20 +612,28 @@ class ShiftSchedulerService:
             workday_assignments = assignments.filter(is_workday=True).count()
             holiday_assignments = total_assignments - workday_assignments
             
-            # 希望実現率の計算
-            total_requests = ShiftRequest.objects.filter(period=period).count()
+            # 希望実現率の計算（割り当てを辞書化して1クエリで照合）
+            assignments_map = {
+                (staff_id, date): is_workday
+                for staff_id, date, is_workday
+                in assignments.values_list('staff_id', 'date', 'is_workday')
+            }
+
+            total_requests = 0
             fulfilled_requests = 0
-            
-            for request in ShiftRequest.objects.filter(period=period):
-                assignment = assignments.filter(
-                    staff=request.staff, date=request.date
-                ).first()
-                
-                if assignment:
-                    if request.priority == 1 and not assignment.is_workday:
-                        fulfilled_requests += 1  # 休み希望が実現
-                    elif request.priority in [2, 3] and assignment.is_workday:
-                        fulfilled_requests += 1  # 勤務希望が実現
+
+            for staff_id, date, priority in ShiftRequest.objects.filter(
+                period=period
+            ).values_list('staff_id', 'date', 'priority'):
+                total_requests += 1
+                is_workday = assignments_map.get((staff_id, date))
+
+                if is_workday is None:
+                    continue
+                if priority == 1 and not is_workday:
+                    fulfilled_requests += 1  # 休み希望が実現
+                elif priority in (2, 3) and is_workday:
+                    fulfilled_requests += 1  # 勤務希望が実現
             
             fulfillment_rate = (fulfilled_requests / total_requests * 100) if total_requests > 0 else 0
             
@@ -481,8 +652,22 @@ class ShiftSchedulerService:
 
 
 # Celeryタスク用のラッパー関数
-def run_shift_optimization_task(period_id: int, user_id: Optional[int] = None):
-    """
-    Celeryで非同期実行するためのタスク関数
-    """
-    return ShiftSchedulerService.generate_schedule(period_id, user_id)
+try:
+    from celery import shared_task
+
+    @shared_task(bind=True, queue='optimizer')
+    def run_shift_optimization_task(self, period_id: int,
+                                    user_id: Optional[int] = None):
+        """
+        Celeryで非同期実行するためのタスク関数（最適化専用キュー）
+        """
+        return ShiftSchedulerService.generate_schedule(period_id, user_id)
+
+except ImportError:
+    # Celeryが利用できない場合は同期実行にフォールバック
+    def run_shift_optimization_task(period_id: int,
+                                    user_id: Optional[int] = None):
+        """
+        同期実行するためのタスク関数
+        """
+        return ShiftSchedulerService.generate_schedule(period_id, user_id)
@@ -5,9 +5,125 @@ Shifta Django Application Configuration
 Djangoアプリケーション設定
 """
 
+import sys
+
 from django.apps import AppConfig
+from django.db import transaction
 from django.db.models.signals import post_migrate
 
+# スタッフグループへ付与する権限のコード名
+STAFF_PERMISSION_CODENAMES = (
+    'view_shiftrequest',
+    'add_shiftrequest',
+    'change_shiftrequest',
+    'view_shiftassignment',
+    'view_staffprofile',
+    'change_staffprofile',
+)
+
+
+# シードデータはimport時に一度だけ構築する（post_migrateは
+# デプロイのたびに発火するため、呼び出しごとの辞書再構築を避ける）
+_JOB_SEEDS = (
+    {
+        'name': '通常勤務',
+        'description': '通常の勤務時間',
+        'start_time': '09:00',
+        'end_time': '18:00',
+        'break_duration': 60,
+        'is_active': True,
+        'color': '#007bff',
+        'required_staff': 1,
+    },
+    {
+        'name': '早番',
+        'description': '早朝勤務',
+        'start_time': '06:00',
+        'end_time': '15:00',
+        'break_duration': 60,
+        'is_active': True,
+        'color': '#28a745',
+        'required_staff': 1,
+    },
+    {
+        'name': '遅番',
+        'description': '夜間勤務',
+        'start_time': '13:00',
+        'end_time': '22:00',
+        'break_duration': 60,
+        'is_active': True,
+        'color': '#ffc107',
+        'required_staff': 1,
+    },
+    {
+        'name': '夜勤',
+        'description': '深夜勤務',
+        'start_time': '22:00',
+        'end_time': '06:00',
+        'break_duration': 120,
+        'is_active': True,
+        'color': '#dc3545',
+        'required_staff': 1,
+    },
+)
+
+_HOLIDAY_SEEDS = (
+    {
+        'name': '有給休暇',
+        'description': '年次有給休暇',
+        'annual_days': 20,
+        'carry_over_limit': 20,
+        'is_paid': True,
+        'color': '#17a2b8',
+        'requires_approval': True,
+    },
+    {
+        'name': '特別休暇',
+        'description': '特別な事由による休暇',
+        'annual_days': 5,
+        'carry_over_limit': 0,
+        'is_paid': True,
+        'color': '#6f42c1',
+        'requires_approval': True,
+    },
+    {
+        'name': '欠勤',
+        'description': '無給の欠勤',
+        'annual_days': 0,
+        'carry_over_limit': 0,
+        'is_paid': False,
+        'color': '#dc3545',
+        'requires_approval': False,
+    },
+)
+
+_WORK_STYLE_SEEDS = (
+    {
+        'name': 'フルタイム',
+        'description': '週5日、1日8時間の勤務',
+        'weekly_hours': 40,
+        'max_consecutive_days': 5,
+        'min_rest_hours': 12,
+        'is_active': True,
+    },
+    {
+        'name': 'パートタイム',
+        'description': '短時間勤務',
+        'weekly_hours': 20,
+        'max_consecutive_days': 3,
+        'min_rest_hours': 12,
+        'is_active': True,
+    },
+    {
+        'name': 'シフト制',
+        'description': '交代制勤務',
+        'weekly_hours': 40,
+        'max_consecutive_days': 4,
+        'min_rest_hours': 16,
+        'is_active': True,
+    },
+)
+
 
 class ScheduleConfig(AppConfig):
     """シフト管理アプリケーションの設定クラス"""
@@ -19,171 +135,101 @@ class ScheduleConfig(AppConfig):
     def ready(self):
         """アプリケーション準備完了時の処理"""
         # シグナルハンドラーの登録
-        from . import signals
-        
+        # （collectstatic等のシグナル不要な管理コマンドでは
+        # signalsモジュールのimportコスト自体を省く）
+        if not any(cmd in sys.argv for cmd in ('collectstatic', 'makemigrations')):
+            from . import signals  # noqa: F401
+
         # 初期データセットアップのシグナル
         post_migrate.connect(self.create_initial_data, sender=self)
-        
-        # Celeryタスクの登録（非同期処理用）
-        try:
-            from .tasks import setup_periodic_tasks
-            setup_periodic_tasks()
-        except ImportError:
-            # Celeryが利用できない場合はスキップ
-            pass
+
+        # 定期実行タスクはtasks.py側のon_after_configureシグナルで
+        # Celeryプロセス起動時にのみ登録される（ここでtasksを
+        # importするとmanage.py実行のたびにCeleryクライアントの
+        # 初期化コストを払うことになる）
     
     def create_initial_data(self, sender, **kwargs):
         """初期データの作成"""
         from django.contrib.auth.models import Group, Permission
         from django.contrib.contenttypes.models import ContentType
         from .models import JobType, HolidayType, WorkStyle
+
+        # シード済みならスキップ。post_migrateはマイグレーション実行の
+        # たびに発火するため、2回目以降はSELECT COUNTのみで済ませる
+        if (JobType.objects.count() >= len(_JOB_SEEDS)
+                and HolidayType.objects.count() >= len(_HOLIDAY_SEEDS)
+                and WorkStyle.objects.count() >= len(_WORK_STYLE_SEEDS)):
+            return
+
+        # シードは1トランザクションでまとめてコミットする
+        # （autocommitだとINSERTごとにfsyncが走る）
+        with transaction.atomic():
+            # グループの作成
+            admin_group, created = Group.objects.get_or_create(name='管理者')
+            staff_group, created = Group.objects.get_or_create(name='スタッフ')
         
-        # グループの作成
-        admin_group, created = Group.objects.get_or_create(name='管理者')
-        staff_group, created = Group.objects.get_or_create(name='スタッフ')
-        
-        # 権限の設定
-        content_types = ContentType.objects.filter(app_label='schedule')
-        
-        # 管理者権限
-        admin_permissions = Permission.objects.filter(
-            content_type__in=content_types
-        )
-        admin_group.permissions.set(admin_permissions)
-        
-        # スタッフ権限（制限付き）
-        staff_permissions = Permission.objects.filter(
-            content_type__in=content_types,
-            codename__in=[
-                'view_shiftrequest',
-                'add_shiftrequest',
-                'change_shiftrequest',
-                'view_shiftassignment',
-                'view_staffprofile',
-                'change_staffprofile',
-            ]
-        )
-        staff_group.permissions.set(staff_permissions)
-        
-        # 基本的な勤務タイプの作成
-        default_job_types = [
-            {
-                'name': '通常勤務',
-                'description': '通常の勤務時間',
-                'start_time': '09:00',
-                'end_time': '18:00',
-                'break_duration': 60,
-                'is_active': True,
-                'color': '#007bff',
-                'required_staff': 1,
-            },
-            {
-                'name': '早番',
-                'description': '早朝勤務',
-                'start_time': '06:00',
-                'end_time': '15:00',
-                'break_duration': 60,
-                'is_active': True,
-                'color': '#28a745',
-                'required_staff': 1,
-            },
-            {
-                'name': '遅番',
-                'description': '夜間勤務',
-                'start_time': '13:00',
-                'end_time': '22:00',
-                'break_duration': 60,
-                'is_active': True,
-                'color': '#ffc107',
-                'required_staff': 1,
-            },
-            {
-                'name': '夜勤',
-                'description': '深夜勤務',
-                'start_time': '22:00',
-                'end_time': '06:00',
-                'break_duration': 120,
-                'is_active': True,
-                'color': '#dc3545',
-                'required_staff': 1,
-            },
-        ]
+            # 権限の設定（ContentTypeを一度だけ解決してモデル名→IDの辞書に
+            # まとめ、Permission側はJOINなしのインデックス参照で絞り込む）
+            ct_by_model = {
+                row['model']: row['id']
+                for row in ContentType.objects.filter(
+                    app_label='schedule'
+                ).values('id', 'model')
+            }
+            ct_ids = list(ct_by_model.values())
+
+            # グループ権限はM2Mのthroughモデルへ直接bulk_createする。
+            # permissions.set()は既存行の削除と1件ずつの再追加を行うため、
+            # 不足分だけを差分で一括INSERTする
+            GroupPermission = Group.permissions.through
+
+            def grant_permissions(group, permission_ids):
+                existing_ids = set(
+                    GroupPermission.objects.filter(
+                        group_id=group.id
+                    ).values_list('permission_id', flat=True)
+                )
+                GroupPermission.objects.bulk_create(
+                    [
+                        GroupPermission(group_id=group.id, permission_id=perm_id)
+                        for perm_id in permission_ids
+                        if perm_id not in existing_ids
+                    ],
+                    ignore_conflicts=True,
+                    batch_size=500,
+                )
+
+            # 管理者権限
+            admin_permission_ids = Permission.objects.filter(
+                content_type_id__in=ct_ids
+            ).values_list('id', flat=True)
+            grant_permissions(admin_group, admin_permission_ids)
+
+            # スタッフ権限（制限付き）
+            staff_permission_ids = Permission.objects.filter(
+                content_type_id__in=ct_ids,
+                codename__in=STAFF_PERMISSION_CODENAMES
+            ).values_list('id', flat=True)
+            grant_permissions(staff_group, staff_permission_ids)
         
-        for job_data in default_job_types:
-            JobType.objects.get_or_create(
-                name=job_data['name'],
-                defaults=job_data
+            # 基本的な勤務タイプの作成
+            # nameのユニーク制約に任せて1回のINSERTで投入
+            # （行ごとのget_or_createはSELECT+INSERTの往復がシード行数分かかる）
+            JobType.objects.bulk_create(
+                [JobType(**job_data) for job_data in _JOB_SEEDS],
+                ignore_conflicts=True
             )
-        
-        # 休日タイプの作成
-        default_holiday_types = [
-            {
-                'name': '有給休暇',
-                'description': '年次有給休暇',
-                'annual_days': 20,
-                'carry_over_limit': 20,
-                'is_paid': True,
-                'color': '#17a2b8',
-                'requires_approval': True,
-            },
-            {
-                'name': '特別休暇',
-                'description': '特別な事由による休暇',
-                'annual_days': 5,
-                'carry_over_limit': 0,
-                'is_paid': True,
-                'color': '#6f42c1',
-                'requires_approval': True,
-            },
-            {
-                'name': '欠勤',
-                'description': '無給の欠勤',
-                'annual_days': 0,
-                'carry_over_limit': 0,
-                'is_paid': False,
-                'color': '#dc3545',
-                'requires_approval': False,
-            },
-        ]
-        
-        for holiday_data in default_holiday_types:
-            HolidayType.objects.get_or_create(
-                name=holiday_data['name'],
-                defaults=holiday_data
+
+            # 休日タイプの作成
+            HolidayType.objects.bulk_create(
+                [HolidayType(**holiday_data) for holiday_data in _HOLIDAY_SEEDS],
+                ignore_conflicts=True
             )
-        
-        # 勤務スタイルの作成
-        default_work_styles = [
-            {
-                'name': 'フルタイム',
-                'description': '週5日、1日8時間の勤務',
-                'weekly_hours': 40,
-                'max_consecutive_days': 5,
-                'min_rest_hours': 12,
-                'is_active': True,
-            },
-            {
-                'name': 'パートタイム',
-                'description': '短時間勤務',
-                'weekly_hours': 20,
-                'max_consecutive_days': 3,
-                'min_rest_hours': 12,
-                'is_active': True,
-            },
-            {
-                'name': 'シフト制',
-                'description': '交代制勤務',
-                'weekly_hours': 40,
-                'max_consecutive_days': 4,
-                'min_rest_hours': 16,
-                'is_active': True,
-            },
-        ]
-        
-        for style_data in default_work_styles:
-            WorkStyle.objects.get_or_create(
-                name=style_data['name'],
-                defaults=style_data
+
+            # 勤務スタイルの作成
+            WorkStyle.objects.bulk_create(
+                [WorkStyle(**style_data) for style_data in _WORK_STYLE_SEEDS],
+                ignore_conflicts=True
             )
 
 
@@ -6,52 +6,104 @@ Shifta Forms
 """
 
 from django import forms
-from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
+from django.contrib.auth.forms import (
+    AuthenticationForm, UserCreationForm, UsernameField
+)
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Field, Submit, Row, Column, HTML
-from crispy_forms.bootstrap import FormActions
 from .models import (
     StaffProfile, ShiftRequest, SchedulePeriod, 
     JobType, HolidayType, WorkStyle
 )
 
 
+def _build_helper(layout, **attrs):
+    """クラス単位で共有するFormHelperを構築する
+
+    レイアウト木とFormHelperの生成はリクエストごとに繰り返すと
+    割り当てコストが無視できないため、モジュールロード時に一度だけ
+    構築して全インスタンスで共有する（レンダリングはレイアウトを
+    変更しないので共有は安全）。
+    """
+    helper = FormHelper()
+    helper.form_method = 'post'
+    for name, value in attrs.items():
+        setattr(helper, name, value)
+    helper.layout = layout
+    return helper
+
+
+_LOGIN_HELPER = _build_helper(
+    Layout(
+        Field('username', placeholder='ユーザー名またはメールアドレス',
+              css_class='form-control-lg mobile-input'),
+        Field('password', placeholder='パスワード',
+              css_class='form-control-lg mobile-input'),
+        HTML('<div class="form-check mb-3">'
+             '<input class="form-check-input" type="checkbox" id="remember_me">'
+             '<label class="form-check-label" for="remember_me">ログイン状態を保持する</label>'
+             '</div>'),
+        Submit('submit', 'ログイン', css_class='btn btn-primary btn-lg w-100 mobile-btn')
+    ),
+    form_class='mobile-optimized',
+)
+
+
 class CustomLoginForm(AuthenticationForm):
     """カスタムログインフォーム（スマートフォン最適化）"""
-    
+
+    # ウィジェット属性はクラス定義時に一度だけ構築する
+    # （インスタンスごとのattrs.updateを排除）
+    username = UsernameField(widget=forms.TextInput(attrs={
+        'autofocus': True,
+        'autocomplete': 'username',
+        'inputmode': 'text',
+    }))
+    password = forms.CharField(
+        label=_("Password"),
+        strip=False,
+        widget=forms.PasswordInput(attrs={'autocomplete': 'current-password'}),
+    )
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.form_class = 'mobile-optimized'
-        self.helper.layout = Layout(
-            Field('username', placeholder='ユーザー名またはメールアドレス',
-                  css_class='form-control-lg mobile-input'),
-            Field('password', placeholder='パスワード',
-                  css_class='form-control-lg mobile-input'),
-            HTML('<div class="form-check mb-3">'
-                 '<input class="form-check-input" type="checkbox" id="remember_me">'
-                 '<label class="form-check-label" for="remember_me">ログイン状態を保持する</label>'
-                 '</div>'),
-            Submit('submit', 'ログイン', css_class='btn btn-primary btn-lg w-100 mobile-btn')
-        )
-        
-        # フィールドのカスタマイズ
-        self.fields['username'].widget.attrs.update({
-            'autocomplete': 'username',
-            'inputmode': 'text',
-        })
-        self.fields['password'].widget.attrs.update({
-            'autocomplete': 'current-password',
-        })
+        self.helper = _LOGIN_HELPER
+
+
+_PROFILE_HELPER = _build_helper(
+    Layout(
+        HTML('<h4 class="mb-3">📱 基本情報</h4>'),
+        Row(
+            Column('phone_number', css_class='col-md-6'),
+            Column('emergency_contact', css_class='col-md-6'),
+        ),
+        HTML('<h4 class="mb-3 mt-4">⚙️ 勤務設定</h4>'),
+        'work_style',
+        Row(
+            Column('max_hours_per_week', css_class='col-md-4'),
+            Column('max_consecutive_days', css_class='col-md-4'),
+            Column('min_rest_hours', css_class='col-md-4'),
+        ),
+        HTML('<h4 class="mb-3 mt-4">🎯 希望条件</h4>'),
+        'preferred_job_types',
+        'available_days',
+        Row(
+            Column('preferred_start_time', css_class='col-md-6'),
+            Column('preferred_end_time', css_class='col-md-6'),
+        ),
+        'notes',
+        Submit('submit', '💾 保存', css_class='btn btn-primary btn-lg mobile-btn')
+    ),
+)
 
 
 class StaffProfileForm(forms.ModelForm):
     """スタッフプロフィール設定フォーム"""
-    
+
     class Meta:
         model = StaffProfile
         fields = [
@@ -72,38 +124,36 @@ class StaffProfileForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.layout = Layout(
-            HTML('<h4 class="mb-3">📱 基本情報</h4>'),
-            Row(
-                Column('phone_number', css_class='col-md-6'),
-                Column('emergency_contact', css_class='col-md-6'),
-            ),
-            HTML('<h4 class="mb-3 mt-4">⚙️ 勤務設定</h4>'),
-            'work_style',
-            Row(
-                Column('max_hours_per_week', css_class='col-md-4'),
-                Column('max_consecutive_days', css_class='col-md-4'),
-                Column('min_rest_hours', css_class='col-md-4'),
-            ),
-            HTML('<h4 class="mb-3 mt-4">🎯 希望条件</h4>'),
-            'preferred_job_types',
-            'available_days',
-            Row(
-                Column('preferred_start_time', css_class='col-md-6'),
-                Column('preferred_end_time', css_class='col-md-6'),
-            ),
-            'notes',
-            FormActions(
-                Submit('submit', '💾 保存', css_class='btn btn-primary btn-lg mobile-btn')
-            )
-        )
+        self.helper = _PROFILE_HELPER
+
+
+# 希望度の選択肢は固定なのでインスタンスごとにリストを作らない
+_PREFERENCE_CHOICES = (
+    (5, '🔥 絶対に働きたい'),
+    (4, '😊 できれば働きたい'),
+    (3, '😐 どちらでも良い'),
+    (2, '😔 あまり働きたくない'),
+    (1, '❌ 働けない'),
+)
+
+
+_SHIFT_REQUEST_HELPER = _build_helper(
+    Layout(
+        Field('date', css_class='form-control-lg mobile-input'),
+        Field('job_type', css_class='form-select-lg'),
+        HTML('<div class="preference-selector mb-3">'),
+        Field('preference_level', css_class='preference-radio'),
+        HTML('</div>'),
+        Field('notes', css_class='form-control mobile-input'),
+        Submit('submit', '📝 希望を提出', css_class='btn btn-primary btn-lg w-100 mobile-btn')
+    ),
+    form_class='mobile-shift-form',
+)
 
 
 class ShiftRequestForm(forms.ModelForm):
     """シフト希望提出フォーム（スマートフォン最適化）"""
-    
+
     class Meta:
         model = ShiftRequest
         fields = ['date', 'job_type', 'preference_level', 'notes']
@@ -125,65 +175,67 @@ class ShiftRequestForm(forms.ModelForm):
             })
         
         # 希望度の選択肢をカスタマイズ
-        self.fields['preference_level'].choices = [
-            (5, '🔥 絶対に働きたい'),
-            (4, '😊 できれば働きたい'),
-            (3, '😐 どちらでも良い'),
-            (2, '😔 あまり働きたくない'),
-            (1, '❌ 働けない'),
-        ]
-        
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.form_class = 'mobile-shift-form'
-        self.helper.layout = Layout(
-            Field('date', css_class='form-control-lg mobile-input'),
-            Field('job_type', css_class='form-select-lg'),
-            HTML('<div class="preference-selector mb-3">'),
-            Field('preference_level', css_class='preference-radio'),
-            HTML('</div>'),
-            Field('notes', css_class='form-control mobile-input'),
-            Submit('submit', '📝 希望を提出', css_class='btn btn-primary btn-lg w-100 mobile-btn')
-        )
+        self.fields['preference_level'].choices = _PREFERENCE_CHOICES
+
+        self.helper = _SHIFT_REQUEST_HELPER
+
+
+_BULK_REQUEST_HELPER = _build_helper(
+    Layout(
+        Field('period', css_class='form-select-lg'),
+        HTML('<div id="bulk-request-grid" class="mt-4"></div>'),
+        Submit('submit', '💾 一括保存', css_class='btn btn-success btn-lg w-100 mobile-btn mt-4')
+    ),
+    form_id='bulk-request-form',
+)
 
 
 class BulkShiftRequestForm(forms.Form):
     """一括シフト希望提出フォーム"""
-    
+
     period = forms.ModelChoiceField(
-        queryset=SchedulePeriod.objects.filter(is_active=True),
+        # 実際のクエリセットは__init__で設定（クラス本体で束縛すると
+        # import時に評価対象が固定され、キャッシュも効きにくい）
+        queryset=SchedulePeriod.objects.none(),
         label='対象期間',
         widget=forms.Select(attrs={'class': 'form-select-lg'})
     )
-    
+
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
-        
-        # 未来の期間のみ選択可能
-        self.fields['period'].queryset = SchedulePeriod.objects.filter(
-            is_active=True,
-            request_deadline__gte=timezone.now().date()
-        )
-        
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.form_id = 'bulk-request-form'
-        self.helper.layout = Layout(
-            Field('period', css_class='form-select-lg'),
-            HTML('<div id="bulk-request-grid" class="mt-4"></div>'),
-            Submit('submit', '💾 一括保存', css_class='btn btn-success btn-lg w-100 mobile-btn mt-4')
+
+        # 受付中の期間のみ選択可能（締切判定はSQL側、表示に必要な列のみ取得）
+        self.fields['period'].queryset = SchedulePeriod.open_periods().only(
+            'id', 'name', 'start_date', 'end_date', 'request_deadline'
         )
 
+        self.helper = _BULK_REQUEST_HELPER
+
+
+_ADMIN_SCHEDULE_HELPER = _build_helper(
+    Layout(
+        'period',
+        'optimization_method',
+        HTML('<div class="card mt-3"><div class="card-header">詳細設定</div><div class="card-body">'),
+        'consider_consecutive_days',
+        'balance_workload',
+        'respect_rest_time',
+        HTML('</div></div>'),
+        Submit('preview', '🔍 プレビュー', css_class='btn btn-outline-primary'),
+        Submit('execute', '🤖 AI最適化実行', css_class='btn btn-primary'),
+    ),
+)
+
 
 class AdminScheduleForm(forms.Form):
     """管理者用スケジュール作成フォーム"""
-    
+
     period = forms.ModelChoiceField(
-        queryset=SchedulePeriod.objects.filter(is_active=True),
+        queryset=SchedulePeriod.objects.none(),
         label='対象期間'
     )
-    
+
     optimization_method = forms.ChoiceField(
         choices=[
             ('balanced', 'バランス重視'),
@@ -215,26 +267,30 @@ class AdminScheduleForm(forms.Form):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.layout = Layout(
-            'period',
-            'optimization_method',
-            HTML('<div class="card mt-3"><div class="card-header">詳細設定</div><div class="card-body">'),
-            'consider_consecutive_days',
-            'balance_workload',
-            'respect_rest_time',
-            HTML('</div></div>'),
-            FormActions(
-                Submit('preview', '🔍 プレビュー', css_class='btn btn-outline-primary'),
-                Submit('execute', '🤖 AI最適化実行', css_class='btn btn-primary'),
-            )
-        )
+
+        self.fields['period'].queryset = SchedulePeriod.objects.filter(
+            is_active=True
+        ).only('id', 'name', 'start_date', 'end_date', 'request_deadline')
+
+        self.helper = _ADMIN_SCHEDULE_HELPER
+
+
+_HOLIDAY_REQUEST_HELPER = _build_helper(
+    Layout(
+        'holiday_type',
+        Row(
+            Column('start_date', css_class='col-md-6'),
+            Column('end_date', css_class='col-md-6'),
+        ),
+        'reason',
+        Submit('submit', '📋 申請', css_class='btn btn-warning btn-lg mobile-btn')
+    ),
+)
 
 
 class HolidayRequestForm(forms.Form):
     """休暇申請フォーム"""
-    
+
     holiday_type = forms.ModelChoiceField(
         queryset=HolidayType.objects.filter(is_active=True),
         label='休暇種別'
@@ -258,18 +314,8 @@ class HolidayRequestForm(forms.Form):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.layout = Layout(
-            'holiday_type',
-            Row(
-                Column('start_date', css_class='col-md-6'),
-                Column('end_date', css_class='col-md-6'),
-            ),
-            'reason',
-            Submit('submit', '📋 申請', css_class='btn btn-warning btn-lg mobile-btn')
-        )
-    
+        self.helper = _HOLIDAY_REQUEST_HELPER
+
     def clean(self):
         cleaned_data = super().clean()
         start_date = cleaned_data.get('start_date')
@@ -280,15 +326,28 @@ class HolidayRequestForm(forms.Form):
                 raise ValidationError('終了日は開始日以降の日付を選択してください。')
             
             # 過去の日付チェック
-            if start_date < timezone.now().date():
+            if start_date < timezone.localdate():
                 raise ValidationError('過去の日付は選択できません。')
         
         return cleaned_data
 
 
+_FEEDBACK_HELPER = _build_helper(
+    Layout(
+        Row(
+            Column('category', css_class='col-md-6'),
+            Column('priority', css_class='col-md-6'),
+        ),
+        'subject',
+        'message',
+        Submit('submit', '📤 送信', css_class='btn btn-info btn-lg mobile-btn')
+    ),
+)
+
+
 class FeedbackForm(forms.Form):
     """フィードバック・要望フォーム"""
-    
+
     CATEGORY_CHOICES = [
         ('bug', '🐛 バグ報告'),
         ('feature', '💡 機能要望'),
@@ -325,14 +384,4 @@ class FeedbackForm(forms.Form):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.helper = FormHelper()
-        self.helper.form_method = 'post'
-        self.helper.layout = Layout(
-            Row(
-                Column('category', css_class='col-md-6'),
-                Column('priority', css_class='col-md-6'),
-            ),
-            'subject',
-            'message',
-            Submit('submit', '📤 送信', css_class='btn btn-info btn-lg mobile-btn')
-        )
+        self.helper = _FEEDBACK_HELPER
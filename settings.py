@@ -84,6 +84,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # リクエストごとの接続確立・切断を避けるため接続を使い回す
+        # （PostgreSQL運用時に特に効く）。再利用時の死活確認も有効化
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -96,6 +100,8 @@ DATABASES = {
 #         'PASSWORD': os.environ.get('DB_PASSWORD', ''),
 #         'HOST': os.environ.get('DB_HOST', 'localhost'),
 #         'PORT': os.environ.get('DB_PORT', '5432'),
+#         'CONN_MAX_AGE': 60,
+#         'CONN_HEALTH_CHECKS': True,
 #     }
 # }
 
@@ -0,0 +1,78 @@
+# shifta/celery.py
+"""
+Shifta Celery Application
+スマートフォン対応シフト管理システム
+Celeryアプリケーション定義
+
+tasks.pyでアプリを組み立てるとDjangoワーカーがtasksをimportするたびに
+Celeryアプリの生成とautodiscoverの再走査が走るため、標準の
+プロジェクト直下celery.pyパターンに分離する。
+shifta/__init__.py には
+    from .celery import app as celery_app
+    __all__ = ('celery_app',)
+を置いて、ワーカー起動時に一度だけ読み込まれるようにする。
+"""
+
+import os
+import logging
+
+from celery import Celery
+from celery.schedules import crontab
+
+logger = logging.getLogger(__name__)
+
+# Djangoの設定モジュールをCeleryに伝える
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shifta.settings')
+
+# Celeryアプリケーションの初期化（プロジェクトで唯一のインスタンス）
+app = Celery('shifta')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+# Celery設定
+from django.conf import settings  # noqa: E402  Django設定読込後に参照する
+
+if hasattr(settings, 'CELERY_BROKER_URL'):
+    app.conf.update(
+        broker_url=settings.CELERY_BROKER_URL,
+        result_backend=settings.CELERY_RESULT_BACKEND,
+        task_serializer='json',
+        accept_content=['json'],
+        result_serializer='json',
+        timezone='Asia/Tokyo',
+        enable_utc=True,
+        worker_prefetch_multiplier=1,
+        task_acks_late=True,
+        worker_max_tasks_per_child=1000,
+    )
+
+
+@app.on_after_configure.connect
+def setup_periodic_tasks(sender, **kwargs):
+    """定期実行タスクのセットアップ
+
+    Celeryのbeat/ワーカープロセス設定完了時にのみ発火する。
+    （Django起動時に呼ぶとWebワーカーや管理コマンドでも
+    Celery設定コストを払ってしまう）
+    """
+    # 毎日18:00にシフトリマインダーを送信
+    sender.conf.beat_schedule = {
+        'send-shift-reminders': {
+            'task': 'schedule.tasks.send_shift_reminders',
+            'schedule': crontab(hour=18, minute=0),
+        },
+
+        # 毎月1日の早朝に月次レポートを生成
+        'generate-monthly-reports': {
+            'task': 'schedule.tasks.generate_monthly_reports',
+            'schedule': crontab(hour=3, minute=0, day_of_month=1),
+        },
+
+        # 毎週日曜日の深夜にデータクリーンアップ
+        'cleanup-old-data': {
+            'task': 'schedule.tasks.cleanup_old_data',
+            'schedule': crontab(hour=2, minute=0, day_of_week=0),
+        },
+    }
+
+    sender.conf.timezone = 'Asia/Tokyo'
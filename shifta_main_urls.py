@@ -5,6 +5,8 @@ Shifta Project Main URL Configuration
 メインURL設定ファイル
 """
 
+import django
+
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
@@ -14,21 +16,31 @@ from django.http import HttpResponse
 from django.shortcuts import render
 
 # 基本的な設定確認用ビュー
+
+# ヘルスチェックはロードバランサから高頻度で叩かれるため、
+# ボディは事前に用意したバイト列を使い回す
+_HEALTH_OK = b"OK"
+
+
 def health_check(request):
     """システムヘルスチェック"""
-    return HttpResponse("OK", content_type="text/plain")
+    return HttpResponse(_HEALTH_OK, content_type="text/plain")
+
+# システム情報はプロセス生存中は不変なのでコンテキストを事前構築する
+_SYSTEM_INFO_CONTEXT = {
+    'debug': settings.DEBUG,
+    'version': '1.0.0',
+    'django_version': django.get_version(),
+}
+
 
 def system_info(request):
     """システム情報表示"""
     if not request.user.is_superuser:
         from django.http import HttpResponseForbidden
         return HttpResponseForbidden("Access denied")
-    
-    return render(request, 'debug/system_info.html', {
-        'debug': settings.DEBUG,
-        'version': '1.0.0',
-        'django_version': __import__('django').get_version(),
-    })
+
+    return render(request, 'debug/system_info.html', _SYSTEM_INFO_CONTEXT)
 
 # メインURL設定
 urlpatterns = [
@@ -36,7 +48,9 @@ urlpatterns = [
     path('django-admin/', admin.site.urls),
     
     # ホームページ（シフトアプリにリダイレクト）
-    path('', RedirectView.as_view(url='/schedule/', permanent=False)),
+    # 301にしておくとブラウザがリダイレクトをキャッシュし、
+    # 2回目以降のルートアクセスはサーバーに到達しない
+    path('', RedirectView.as_view(pattern_name='schedule:home', permanent=True)),
     
     # シフト管理システム
     path('schedule/', include('schedule.urls')),
@@ -48,27 +62,30 @@ urlpatterns = [
 
 # 開発環境用設定
 if settings.DEBUG:
-    import debug_toolbar
-    
-    # Django Debug Toolbar
-    urlpatterns += [
-        path('__debug__/', include(debug_toolbar.urls)),
-    ]
-    
-    # 静的ファイルとメディアファイルの配信
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    
-    # 開発用追加URL
+    # debug_toolbarはSQLフォーマッタ等を含みimportが重いため、
+    # URLパターンを組み立てる直前に遅延importする
+    from importlib import import_module
+    debug_toolbar = import_module('debug_toolbar')
+
     from django.views.generic import TemplateView
-    
-    urlpatterns += [
+
+    # 開発用URLは1つのリストにまとめ、urlpatternsへの結合は1回で済ませる
+    debug_patterns = [
+        # Django Debug Toolbar
+        path('__debug__/', include(debug_toolbar.urls)),
+
         # 開発用テストページ
         path('dev/test/', TemplateView.as_view(template_name='dev/test.html'), name='dev_test'),
         path('dev/mobile-test/', TemplateView.as_view(template_name='dev/mobile_test.html'), name='mobile_test'),
         path('dev/api-test/', TemplateView.as_view(template_name='dev/api_test.html'), name='api_test'),
+
+        # 静的ファイルとメディアファイルの配信
+        *static(settings.STATIC_URL, document_root=settings.STATIC_ROOT),
+        *static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
     ]
 
+    urlpatterns += debug_patterns
+
 # カスタムエラーハンドラー
 handler404 = 'schedule.views.handler404'
 handler500 = 'schedule.views.handler500'
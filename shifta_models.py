@@ -11,12 +11,27 @@ Shifta - スマートフォン対応シフト管理システム
 """
 
 import datetime
+from functools import lru_cache
+
 from django.db import models
+from django.db.models.functions import Now
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.core.exceptions import ValidationError
 
+@lru_cache(maxsize=4)
+def _reference_by_id(model_cls):
+    """参照系の小テーブル（職種・休日種別など）をID辞書で丸ごとキャッシュする
+
+    数十行で滅多に変わらないため、行ごとのFK参照をプロセス内の
+    辞書引きに置き換える。更新時はpost_save/post_deleteシグナルで
+    キャッシュをクリアする（本ファイル末尾で接続）。
+    """
+    return model_cls.objects.in_bulk()
+
+
 # --- 1. ユーザーとスタッフ情報 ---
 
 class User(AbstractUser):
@@ -52,6 +67,11 @@ class JobType(models.Model):
         verbose_name_plural = '職種'
         ordering = ['name']
 
+    @classmethod
+    def cached_by_id(cls):
+        """IDをキーにした職種の参照キャッシュ"""
+        return _reference_by_id(cls)
+
     def __str__(self):
         return self.name
 
@@ -145,6 +165,15 @@ class StaffProfile(models.Model):
         return self.user.get_full_name() or self.user.username
 
 
+def _current_year():
+    """休日残数の対象年度デフォルト値
+
+    フィールド定義で timezone.now().year を直接書くと
+    import時の年で固定されてしまうため、callableで遅延評価する。
+    """
+    return timezone.now().year
+
+
 # --- 2. 休日と残数管理 ---
 
 class HolidayType(models.Model):
@@ -172,6 +201,11 @@ class HolidayType(models.Model):
         verbose_name_plural = '休日種別'
         ordering = ['sort_order', 'name']
 
+    @classmethod
+    def cached_by_id(cls):
+        """IDをキーにした休日種別の参照キャッシュ"""
+        return _reference_by_id(cls)
+
     def __str__(self):
         return self.name
 
@@ -189,14 +223,17 @@ class HolidayBalance(models.Model):
         on_delete=models.CASCADE,
         verbose_name="休日種別"
     )
-    balance = models.FloatField(
-        "残日数", 
-        default=0.0,
-        validators=[MinValueValidator(0.0)]
+    balance = models.DecimalField(
+        "残日数",
+        max_digits=5,
+        decimal_places=1,
+        default=0,
+        validators=[MinValueValidator(0)],
+        help_text="0.5日（半休）単位で管理する"
     )
     year = models.PositiveIntegerField(
-        "対象年度", 
-        default=timezone.now().year
+        "対象年度",
+        default=_current_year
     )
     last_updated = models.DateTimeField("最終更新", auto_now=True)
 
@@ -238,26 +275,51 @@ class SchedulePeriod(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def open_periods(cls):
+        """希望提出受付中の期間を返す
+
+        締切判定はNow()でSQL側に寄せる。取得後にis_request_openで
+        1件ずつフィルタするより、1クエリで絞り込めて速い。
+        """
+        return cls.objects.filter(is_active=True, request_deadline__gte=Now())
+
     @property
     def is_request_open(self):
-        """希望提出期間中かどうか"""
+        """希望提出期間中かどうか
+
+        時刻に依存するためキャッシュしない。ループ内で多数の期間を
+        判定する場合は、呼び出し側でtimezone.now()を一度だけ取得して
+        request_deadlineと直接比較すること。
+        """
         return timezone.now() <= self.request_deadline
 
-    @property
+    @cached_property
     def days_count(self):
-        """期間の日数"""
+        """期間の日数（インスタンス生存中は不変なのでキャッシュする）"""
         return (self.end_date - self.start_date).days + 1
 
 
+class ShiftRequestQuerySet(models.QuerySet):
+    """ShiftRequest用のクエリセット"""
+
+    def with_related(self):
+        """表示に必要なFK先をJOINで一括取得する（N+1回避用）"""
+        return self.select_related('staff__user', 'period')
+
+
 class ShiftRequest(models.Model):
     """スタッフからの勤務希望"""
-    
+
     PRIORITY_CHOICES = [
         (1, '休み希望'),
         (2, '勤務可'),
         (3, '勤務最優先'),
     ]
-    
+
+    # 呼び出しごとのdict(PRIORITY_CHOICES)再構築を避けるための参照用マップ
+    _PRIORITY_MAP = dict(PRIORITY_CHOICES)
+
     staff = models.ForeignKey(
         StaffProfile, 
         on_delete=models.CASCADE, 
@@ -280,12 +342,18 @@ class ShiftRequest(models.Model):
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
     updated_at = models.DateTimeField("更新日時", auto_now=True)
 
+    objects = ShiftRequestQuerySet.as_manager()
+
     class Meta:
         db_table = 'schedule_shift_request'
         verbose_name = 'シフト希望'
         verbose_name_plural = 'シフト希望'
         unique_together = ('staff', 'date')
         ordering = ['date', 'staff']
+        indexes = [
+            # 期間別ローダーと希望提出状況の集計で使用
+            models.Index(fields=['period', 'staff', 'date']),
+        ]
 
     def clean(self):
         if self.period and self.date:
@@ -293,13 +361,13 @@ class ShiftRequest(models.Model):
                 raise ValidationError('希望日は対象期間内である必要があります。')
 
     def __str__(self):
-        priority_label = dict(self.PRIORITY_CHOICES)[self.priority]
+        priority_label = self._PRIORITY_MAP[self.priority]
         return f"{self.staff.display_name} on {self.date} ({priority_label})"
 
     @property
     def priority_display(self):
         """優先度の表示名"""
-        return dict(self.PRIORITY_CHOICES)[self.priority]
+        return self._PRIORITY_MAP[self.priority]
 
 
 # --- 4. 管理者設定とAIによる割り当て結果 ---
@@ -334,6 +402,11 @@ class DailyRequirement(models.Model):
         verbose_name_plural = '日別必要人数'
         unique_together = ('date', 'job_type')
         ordering = ['date', 'job_type']
+        indexes = [
+            # 期間別ローダーと設定済み日数カウントで使用
+            # （(date, job_type)はunique_togetherのインデックスで賄える）
+            models.Index(fields=['period', 'date']),
+        ]
 
     def clean(self):
         if self.min_staff_count > self.required_staff_count:
@@ -343,6 +416,18 @@ class DailyRequirement(models.Model):
         return f"{self.date} ({self.job_type.name}): {self.min_staff_count} - {self.required_staff_count}人"
 
 
+class ShiftAssignmentQuerySet(models.QuerySet):
+    """ShiftAssignment用のクエリセット"""
+
+    def with_related(self):
+        """表示に必要なFK先をJOINで一括取得する（N+1回避用）
+
+        __str__/status_displayはstaff.display_name（→user）と
+        holiday_type.nameを参照するため、一覧表示では必ずこれを通す。
+        """
+        return self.select_related('staff__user', 'staff__job_type', 'holiday_type')
+
+
 class ShiftAssignment(models.Model):
     """AIによって生成・確定された最終勤務表"""
     staff = models.ForeignKey(
@@ -366,33 +451,49 @@ class ShiftAssignment(models.Model):
     created_at = models.DateTimeField("作成日時", auto_now_add=True)
     updated_at = models.DateTimeField("更新日時", auto_now=True)
 
+    objects = ShiftAssignmentQuerySet.as_manager()
+
     class Meta:
         db_table = 'schedule_shift_assignment'
         verbose_name = 'シフト割り当て'
         verbose_name_plural = 'シフト割り当て'
         unique_together = ('staff', 'date')
         ordering = ['date', 'staff']
+        indexes = [
+            # 日付レンジ・月別のスキャンで使用
+            # （unique_togetherのインデックスは(staff, date)始まりのため
+            # 日付を先頭にしたレンジ検索には効かない）
+            models.Index(fields=['date']),
+            # 月次レポートの勤務日集計で使用
+            models.Index(fields=['date', 'is_workday']),
+        ]
 
     def clean(self):
-        if not self.is_workday and not self.holiday_type:
+        # 勤務日⇔休日種別は排他。holiday_typeではなくholiday_type_idを
+        # 参照することで、未ロードFKの遅延SELECTを発生させない
+        # （一括インポートで数千行をfull_clean()する経路で効く）
+        if bool(self.is_workday) == bool(self.holiday_type_id):
+            if self.is_workday:
+                raise ValidationError('勤務日の場合は休日種別を指定できません。')
             raise ValidationError('休日の場合は休日種別を指定してください。')
-        if self.is_workday and self.holiday_type:
-            raise ValidationError('勤務日の場合は休日種別を指定できません。')
 
     def __str__(self):
-        if self.is_workday:
-            status = "勤務"
-        else:
-            status = f"休み ({self.holiday_type.name if self.holiday_type else ''})"
-        return f"{self.date} - {self.staff.display_name}: {status}"
+        return f"{self.date} - {self.staff.display_name}: {self.status_display}"
 
     @property
     def status_display(self):
-        """ステータスの表示名"""
+        """ステータスの表示名
+
+        holiday_type_id＋参照キャッシュ経由で引くことで、
+        select_relatedなしで一覧を舐めてもFKのDBアクセスが発生しない。
+        """
         if self.is_workday:
             return "勤務"
-        else:
-            return f"休み ({self.holiday_type.name if self.holiday_type else ''})"
+        holiday = (
+            HolidayType.cached_by_id().get(self.holiday_type_id)
+            if self.holiday_type_id else None
+        )
+        return f"休み ({holiday.name if holiday else ''})"
 
 
 # --- 5. システム管理用モデル ---
@@ -406,7 +507,10 @@ class ScheduleLog(models.Model):
         ('finalize', '確定'),
         ('notification', '通知送信'),
     ]
-    
+
+    # 呼び出しごとのdict(ACTION_CHOICES)再構築を避けるための参照用マップ
+    _ACTION_MAP = dict(ACTION_CHOICES)
+
     period = models.ForeignKey(
         SchedulePeriod, 
         on_delete=models.CASCADE,
@@ -431,6 +535,18 @@ class ScheduleLog(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        action_label = dict(self.ACTION_CHOICES)[self.action]
+        action_label = self._ACTION_MAP[self.action]
         status = "成功" if self.success else "失敗"
         return f"{self.period.name} - {action_label} ({status})"
+
+
+# --- 参照キャッシュの無効化 ---
+
+def _clear_reference_cache(**kwargs):
+    """参照系テーブルの更新時にin_bulkキャッシュを破棄する"""
+    _reference_by_id.cache_clear()
+
+
+for _reference_model in (JobType, HolidayType):
+    models.signals.post_save.connect(_clear_reference_cache, sender=_reference_model)
+    models.signals.post_delete.connect(_clear_reference_cache, sender=_reference_model)
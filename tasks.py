@@ -5,21 +5,20 @@ Shifta Celery Tasks
 非同期処理タスク定義
 """
 
-from celery import Celery, shared_task
-from celery.schedules import crontab
+from celery import group, shared_task
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import get_template
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Celeryアプリケーションの初期化
-app = Celery('shifta')
-app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
+# Celeryアプリケーション本体とbeatスケジュールはshifta/celery.pyに
+# 定義されている。このモジュールは@shared_taskの宣言のみを持ち、
+# ワーカーのautodiscoverから一度だけ読み込まれる。
 
 
 @shared_task(bind=True, max_retries=3)
@@ -36,19 +35,33 @@ def optimize_schedule_task(self, period_id):
         
         # 対象期間の取得
         period = SchedulePeriod.objects.get(id=period_id)
-        
-        # 既存の割り当てをクリア
-        ShiftAssignment.objects.filter(
-            date__range=[period.start_date, period.end_date]
-        ).delete()
-        
+
         # AI最適化実行
         optimizer = ShiftOptimizer()
         result = optimizer.optimize_period(period)
-        
+
         if result['success']:
             logger.info(f"スケジュール最適化完了: Period {period_id}")
-            
+
+            # 最適化結果はUPSERTで一括反映する。DELETE→INSERTの
+            # 全行書き換えと違い、既存行はインプレース更新・新規行のみ
+            # INSERTとなるため、インデックスとWALの二重書き換えを避けられる
+            # （最適化は期間内の全(スタッフ, 日付)を出力するので、
+            # 範囲DELETEなしでも取り残しは発生しない）
+            assignments = result.get('assignments') or []
+            if assignments:
+                with transaction.atomic():
+                    ShiftAssignment.objects.bulk_create(
+                        assignments,
+                        update_conflicts=True,
+                        unique_fields=['staff', 'date'],
+                        update_fields=[
+                            'is_workday', 'holiday_type', 'notes',
+                            'created_by_ai', 'manually_adjusted', 'updated_at',
+                        ],
+                        batch_size=5000,
+                    )
+
             # 最適化結果の保存
             period.optimization_status = 'completed'
             period.optimization_score = result.get('score', 0)
@@ -101,34 +114,43 @@ def send_optimization_notification(period_id, status, result):
         User = get_user_model()
         period = SchedulePeriod.objects.get(id=period_id)
         
-        # 管理者ユーザーを取得
-        admin_users = User.objects.filter(is_staff=True, is_active=True)
-        
+        # 管理者ユーザーを取得（メール作成に使う列のみ）
+        admin_users = User.objects.filter(
+            is_staff=True, is_active=True
+        ).only('id', 'email', 'username', 'first_name', 'last_name')
+
+        # テンプレートはループ前に一度だけ解決する
+        # （render_to_stringは呼ぶたびにローダーを再走査する）
         if status == 'success':
             subject = f'シフト最適化完了: {period.name}'
-            template = 'emails/optimization_success.html'
+            template = get_template('emails/optimization_success.html')
         else:
             subject = f'シフト最適化エラー: {period.name}'
-            template = 'emails/optimization_error.html'
-        
-        # メール送信
+            template = get_template('emails/optimization_error.html')
+
+        # メールはSMTP接続1本でまとめて送信する
+        messages = []
         for admin in admin_users:
-            message = render_to_string(template, {
+            html_body = template.render({
                 'user': admin,
                 'period': period,
                 'result': result,
                 'status': status,
             })
-            
-            send_mail(
+
+            message = EmailMultiAlternatives(
                 subject=subject,
-                message='',
-                html_message=message,
+                body='',
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[admin.email],
-                fail_silently=False,
+                to=[admin.email],
             )
-        
+            message.attach_alternative(html_body, 'text/html')
+            messages.append(message)
+
+        if messages:
+            with get_connection() as mail_connection:
+                mail_connection.send_messages(messages)
+
         logger.info(f"最適化通知送信完了: {period_id} ({status})")
         
     except Exception as exc:
@@ -139,9 +161,10 @@ def send_optimization_notification(period_id, status, result):
 def send_shift_reminders():
     """シフト希望提出リマインダーの送信"""
     try:
-        from .models import SchedulePeriod
+        from .models import SchedulePeriod, ShiftRequest
         from django.contrib.auth import get_user_model
-        
+        from django.db.models import Exists, OuterRef
+
         User = get_user_model()
         today = timezone.now().date()
         
@@ -150,46 +173,83 @@ def send_shift_reminders():
         periods = SchedulePeriod.objects.filter(
             request_deadline=tomorrow,
             is_active=True
-        )
+        ).only('id', 'name', 'start_date', 'end_date', 'request_deadline')
         
+        # 本タスクは宛先の洗い出しだけを行い、送信は1通1サブタスクで
+        # ワーカー群にファンアウトする。SMTPのI/O待ちがワーカーの
+        # 並列度ぶんだけ重なり、逐次送信よりも早く完了する
+        reminder_signatures = []
         for period in periods:
-            # まだ希望を提出していないスタッフを取得
-            submitted_users = period.shift_requests.values_list('user', flat=True).distinct()
-            pending_users = User.objects.filter(
+            # まだ希望を提出していないスタッフを取得。
+            # 提出済みIDリストをexcludeに展開する代わりにNOT EXISTSの
+            # 相関サブクエリにして、DB側でアンチジョインさせる
+            # （ShiftRequestのFKはStaffProfileなのでstaff__user_idで辿る）
+            pending_user_ids = User.objects.filter(
                 is_active=True,
                 groups__name='スタッフ'
-            ).exclude(id__in=submitted_users)
-            
-            # リマインダー送信
-            for user in pending_users:
-                message = render_to_string('emails/shift_reminder.html', {
-                    'user': user,
-                    'period': period,
-                    'deadline': period.request_deadline,
-                })
-                
-                send_mail(
-                    subject=f'シフト希望提出リマインダー: {period.name}',
-                    message='',
-                    html_message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[user.email],
-                    fail_silently=False,
-                )
-        
-        logger.info("シフトリマインダー送信完了")
-        
+            ).exclude(
+                Exists(ShiftRequest.objects.filter(
+                    period=period,
+                    staff__user_id=OuterRef('pk'),
+                ))
+            ).values_list('id', flat=True)
+
+            reminder_signatures.extend(
+                send_single_reminder.s(period.id, user_id)
+                for user_id in pending_user_ids
+            )
+
+        if reminder_signatures:
+            group(reminder_signatures).apply_async()
+
+        logger.info(f"シフトリマインダー送信開始: {len(reminder_signatures)}通")
+
     except Exception as exc:
         logger.error(f"リマインダー送信エラー: {exc}")
 
 
+@shared_task
+def send_single_reminder(period_id, user_id):
+    """1スタッフ分のシフト希望リマインダー送信（ファンアウト先）"""
+    try:
+        from .models import SchedulePeriod
+        from django.contrib.auth import get_user_model
+
+        User = get_user_model()
+        period = SchedulePeriod.objects.only(
+            'id', 'name', 'start_date', 'end_date', 'request_deadline'
+        ).get(id=period_id)
+        user = User.objects.only(
+            'id', 'email', 'username', 'first_name', 'last_name'
+        ).get(id=user_id)
+
+        html_body = get_template('emails/shift_reminder.html').render({
+            'user': user,
+            'period': period,
+            'deadline': period.request_deadline,
+        })
+
+        message = EmailMultiAlternatives(
+            subject=f'シフト希望提出リマインダー: {period.name}',
+            body='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[user.email],
+        )
+        message.attach_alternative(html_body, 'text/html')
+        message.send()
+
+    except Exception as exc:
+        logger.error(f"リマインダー送信エラー: period={period_id} user={user_id} {exc}")
+
+
 @shared_task
 def generate_monthly_reports():
     """月次レポートの自動生成"""
     try:
         from .models import SchedulePeriod, ShiftAssignment
         from .utils import generate_report_data
-        
+        from django.db.models import Count, Q
+
         # 前月のデータを対象とする
         last_month = timezone.now().replace(day=1) - timedelta(days=1)
         year, month = last_month.year, last_month.month
@@ -199,14 +259,29 @@ def generate_monthly_reports():
             date__year=year,
             date__month=month
         )
-        
+
         if assignments.exists():
             # レポートデータ生成
-            report_data = generate_report_data(assignments)
-            
+            # 勤務日/休日のカウントは全行をPythonに運ばず、
+            # DB側の集計スキャン1回ずつにまとめる
+            staff_summaries = list(
+                assignments.values('staff_id').annotate(
+                    workdays=Count('id', filter=Q(is_workday=True)),
+                    holidays=Count('id', filter=Q(is_workday=False)),
+                )
+            )
+            holiday_breakdown = list(
+                assignments.filter(is_workday=False)
+                .values('staff_id', 'holiday_type_id')
+                .annotate(count=Count('id'))
+            )
+            report_data = generate_report_data(
+                staff_summaries, holiday_breakdown=holiday_breakdown
+            )
+
             # レポートファイルの保存
             # TODO: ファイル保存処理の実装
-            
+
             logger.info(f"月次レポート生成完了: {year}/{month}")
         
     except Exception as exc:
@@ -221,65 +296,31 @@ def cleanup_old_data():
         
         # 1年以上前のデータを削除
         cutoff_date = timezone.now().date() - timedelta(days=365)
-        
-        # 古い期間とその関連データを削除
-        old_periods = SchedulePeriod.objects.filter(end_date__lt=cutoff_date)
-        deleted_count = 0
-        
-        for period in old_periods:
-            # 関連データの削除
-            ShiftRequest.objects.filter(period=period).delete()
-            ShiftAssignment.objects.filter(
-                date__range=[period.start_date, period.end_date]
+
+        # 期間ごとのループをやめてセット単位のDELETEにまとめる。
+        # 大物2テーブルは_raw_deleteで落とす: 通常の.delete()は
+        # シグナル発火のために全PKをSELECTしてメモリに載せるが、
+        # これらのモデルにシグナルハンドラは登録されていないため
+        # 1文のDELETEで済ませられる
+        with transaction.atomic():
+            old_assignments = ShiftAssignment.objects.filter(date__lt=cutoff_date)
+            old_assignments._raw_delete(old_assignments.db)
+
+            old_requests = ShiftRequest.objects.filter(
+                period__end_date__lt=cutoff_date
+            )
+            old_requests._raw_delete(old_requests.db)
+
+            # 期間本体は残りの関連（日別必要人数・ログ）のCASCADEを
+            # ORMに任せるため通常のdelete()のまま
+            _, deleted_by_model = SchedulePeriod.objects.filter(
+                end_date__lt=cutoff_date
             ).delete()
-            
-            # 期間の削除
-            period.delete()
-            deleted_count += 1
-        
+            deleted_count = deleted_by_model.get('schedule.SchedulePeriod', 0)
+
         logger.info(f"古いデータクリーンアップ完了: {deleted_count}件の期間を削除")
         
     except Exception as exc:
         logger.error(f"データクリーンアップエラー: {exc}")
 
 
-def setup_periodic_tasks():
-    """定期実行タスクのセットアップ"""
-    
-    # 毎日18:00にシフトリマインダーを送信
-    app.conf.beat_schedule = {
-        'send-shift-reminders': {
-            'task': 'schedule.tasks.send_shift_reminders',
-            'schedule': crontab(hour=18, minute=0),
-        },
-        
-        # 毎月1日の早朝に月次レポートを生成
-        'generate-monthly-reports': {
-            'task': 'schedule.tasks.generate_monthly_reports',
-            'schedule': crontab(hour=3, minute=0, day_of_month=1),
-        },
-        
-        # 毎週日曜日の深夜にデータクリーンアップ
-        'cleanup-old-data': {
-            'task': 'schedule.tasks.cleanup_old_data',
-            'schedule': crontab(hour=2, minute=0, day_of_week=0),
-        },
-    }
-    
-    app.conf.timezone = 'Asia/Tokyo'
-
-
-# Celery設定
-if hasattr(settings, 'CELERY_BROKER_URL'):
-    app.conf.update(
-        broker_url=settings.CELERY_BROKER_URL,
-        result_backend=settings.CELERY_RESULT_BACKEND,
-        task_serializer='json',
-        accept_content=['json'],
-        result_serializer='json',
-        timezone='Asia/Tokyo',
-        enable_utc=True,
-        worker_prefetch_multiplier=1,
-        task_acks_late=True,
-        worker_max_tasks_per_child=1000,
-    )
@@ -4,12 +4,18 @@ Shifta URL Configuration
 スマートフォン対応シフト管理システムのURL設定
 """
 
+from django.conf import settings
 from django.urls import path, include
 from django.views.generic import RedirectView
 from . import views
 
 app_name = 'schedule'
 
+
+def _redirect(name):
+    """旧URL用の301リダイレクトビューを生成する"""
+    return RedirectView.as_view(pattern_name=f'schedule:{name}', permanent=True)
+
 # スタッフ向けURL（スマートフォン用）
 staff_patterns = [
     # マイスケジュール
@@ -126,22 +132,21 @@ urlpatterns = [
     
     # 公開ページ
     path('', include(public_patterns)),
-    
-    # 開発・デバッグ用（本番環境では削除）
-    path('debug/', views.DebugView.as_view(), name='debug'),
-    path('test/', views.TestView.as_view(), name='test'),
 ]
 
+# 開発・デバッグ用（本番環境ではリゾルバに載せない）
+if settings.DEBUG:
+    urlpatterns += [
+        path('debug/', views.DebugView.as_view(), name='debug'),
+        path('test/', views.TestView.as_view(), name='test'),
+    ]
+
 # レガシーURL（互換性のため）
 legacy_patterns = [
     # 旧URL形式からの自動リダイレクト
-    path('schedule/', RedirectView.as_view(pattern_name='schedule:my_schedule', permanent=True)),
-    path('request/', RedirectView.as_view(pattern_name='schedule:shift_request', permanent=True)),
-    path('admin-dashboard/', RedirectView.as_view(pattern_name='schedule:admin_dashboard', permanent=True)),
+    path('schedule/', _redirect('my_schedule')),
+    path('request/', _redirect('shift_request')),
+    path('admin-dashboard/', _redirect('admin_dashboard')),
 ]
 
 urlpatterns += legacy_patterns
-
-# エラーハンドリング用のURL（プロジェクトのmain urls.pyで設定）
-handler404 = 'schedule.views.handler404'
-handler500 = 'schedule.views.handler500'
@@ -11,7 +11,7 @@ Shifta - スマートフォン対応シフト管理システム
 
 import json
 import logging
-from datetime import datetime, timedelta, date
+from datetime import timedelta, date
 from calendar import monthrange
 from typing import Dict, List, Optional
 
@@ -21,8 +21,9 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.views.generic import TemplateView, View
 from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
+from django.core.cache import cache
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
 from django.db.models import Count, Q
 from django.core.paginator import Paginator
 from django.conf import settings
@@ -34,35 +35,67 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+# orjsonはC実装でstdlib jsonより数倍速い（任意依存）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # --- ユーティリティ関数 ---
 
+def json_response(data, status=200):
+    """JSONレスポンスを生成する
+
+    orjsonが利用可能ならそちらで直列化し、なければJsonResponseに
+    フォールバックする。APIとPOSTハンドラの共通経路。
+    """
+    if orjson is None:
+        return JsonResponse(data, status=status)
+    return HttpResponse(
+        orjson.dumps(data),
+        status=status,
+        content_type='application/json',
+    )
+
+
 def is_admin(user):
     """管理者権限チェック"""
     return user.is_authenticated and (user.is_superuser or user.is_staff)
 
 def get_current_staff_profile(user):
-    """現在のユーザーのスタッフプロフィールを取得"""
+    """現在のユーザーのスタッフプロフィールを取得
+
+    OneToOneのリバースアクセサは初回取得後にuserインスタンス上に
+    キャッシュされるため、同一リクエスト内で複数回呼んでも
+    クエリは1回だけ発行される。
+    """
     try:
         return user.profile
-    except:
+    except StaffProfile.DoesNotExist:
         return None
 
+# date.weekday()は0=月曜なので、月曜始まりで並べる
+_WEEKDAY_NAMES = ['月', '火', '水', '木', '金', '土', '日']
+
+
 def generate_date_list(start_date: date, end_date: date) -> List[Dict]:
-    """日付リストを生成（曜日情報付き）"""
-    date_list = []
-    current_date = start_date
-    weekday_names = ['日', '月', '火', '水', '木', '金', '土']
-    
-    while current_date <= end_date:
-        date_list.append({
-            'date': current_date,
-            'weekday': current_date.weekday(),
-            'weekday_name': weekday_names[current_date.weekday()],
-            'month': current_date.month
-        })
-        current_date += timedelta(days=1)
-    
-    return date_list
+    """日付リストを生成（曜日情報付き）
+
+    希望提出画面のGETごとに呼ばれるため、whileループでの日付加算と
+    行ごとのweekday()呼び出しをやめ、開始曜日からの整数演算で回す。
+    """
+    n_days = (end_date - start_date).days + 1
+    base_weekday = start_date.weekday()
+    dates = [start_date + timedelta(days=i) for i in range(n_days)]
+    return [
+        {
+            'date': d,
+            'weekday': (base_weekday + i) % 7,
+            'weekday_name': _WEEKDAY_NAMES[(base_weekday + i) % 7],
+            'month': d.month,
+        }
+        for i, d in enumerate(dates)
+    ]
 
 # --- スタッフ向けビュー ---
 
@@ -78,19 +111,25 @@ class MyScheduleView(LoginRequiredMixin, TemplateView):
             messages.error(self.request, 'スタッフプロフィールが設定されていません。')
             return context
         
-        # 表示月の取得（デフォルトは現在月）
-        year = int(self.request.GET.get('year', datetime.now().year))
-        month = int(self.request.GET.get('month', datetime.now().month))
+        # 表示月の取得（デフォルトは現在月。今日の日付は1回だけ取得）
+        today = timezone.localdate()
+        year = int(self.request.GET.get('year', today.year))
+        month = int(self.request.GET.get('month', today.month))
         current_month = date(year, month, 1)
         
         # 月間のシフト割り当てを取得
+        _, days_in_month = monthrange(year, month)
         month_start = current_month
-        month_end = date(year, month, monthrange(year, month)[1])
+        month_end = date(year, month, days_in_month)
         
-        assignments = ShiftAssignment.objects.filter(
+        # テンプレートがholiday_type.nameを行ごとに参照するため
+        # JOINで先読みする（APIビューと同じパターン）。
+        # 統計計算とテンプレート描画で同じ結果を使い回すため
+        # ここでリスト化して1クエリに抑える
+        assignments = list(ShiftAssignment.objects.filter(
             staff=staff_profile,
             date__range=(month_start, month_end)
-        ).order_by('date')
+        ).select_related('holiday_type', 'staff').order_by('date'))
         
         # 休日残数を取得
         holiday_balances = HolidayBalance.objects.filter(
@@ -99,11 +138,12 @@ class MyScheduleView(LoginRequiredMixin, TemplateView):
             holiday_type__is_active=True
         ).select_related('holiday_type')
         
-        # 月間統計の計算
-        work_days = assignments.filter(is_workday=True).count()
-        holiday_days = assignments.filter(is_workday=False).count()
-        total_days = monthrange(year, month)[1]
-        remaining_days = total_days - assignments.count()
+        # 月間統計の計算（取得済みリストの1パスで済ませ、
+        # COUNTクエリ3本の往復を省く）
+        work_days = sum(1 for a in assignments if a.is_workday)
+        holiday_days = len(assignments) - work_days
+        total_days = days_in_month
+        remaining_days = total_days - len(assignments)
         
         context.update({
             'current_month': current_month,
@@ -141,12 +181,28 @@ class ShiftRequestView(LoginRequiredMixin, View):
         # 日付リストの生成
         date_list = generate_date_list(period.start_date, period.end_date)
         
-        # 既存の希望を取得
-        existing_requests = {
-            req.date: req.priority 
-            for req in ShiftRequest.objects.filter(staff=staff_profile, period=period)
-        }
-        
+        # 既存の希望を取得。PostgreSQLならgenerate_seriesとの
+        # LEFT JOIN 1回で全日付分のpriorityをマージ済みで受け取る
+        # （希望のない日もNULL行として返るため突き合わせ漏れがない）
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT d::date, r.priority "
+                    "FROM generate_series(%s::date, %s::date, '1 day') AS d "
+                    f"LEFT JOIN {ShiftRequest._meta.db_table} r "
+                    "ON r.date = d::date AND r.staff_id = %s AND r.period_id = %s",
+                    [period.start_date, period.end_date,
+                     staff_profile.id, period.id],
+                )
+                existing_requests = dict(cursor.fetchall())
+        else:
+            # 使うのは(日付, 優先度)の2列だけなのでモデル化せずに取得する
+            existing_requests = dict(
+                ShiftRequest.objects.filter(
+                    staff=staff_profile, period=period
+                ).values_list('date', 'priority')
+            )
+
         # 日付リストに既存希望を結合
         for date_info in date_list:
             date_info['current_priority'] = existing_requests.get(date_info['date'])
@@ -176,63 +232,94 @@ class ShiftRequestView(LoginRequiredMixin, View):
             
             # 締切チェック
             if not period.is_request_open:
-                return JsonResponse({
+                return json_response({
                     'success': False,
                     'message': '希望提出期間が終了しています。'
                 })
             
             with transaction.atomic():
-                # 既存の希望を削除
-                ShiftRequest.objects.filter(
-                    staff=staff_profile,
-                    period=period
-                ).delete()
-                
-                # 新しい希望を作成
+                # 期間内日付の集合を一度だけ構築する
+                # （ループ内での範囲比較と属性参照をO(1)のin判定に置換）
+                valid_dates = {
+                    period.start_date + timedelta(days=i)
+                    for i in range(period.days_count)
+                }
+
+                # 新しい希望を作成。優先度・日付とも不正値は行単位で
+                # スキップし、1件の不正が提出全体を巻き込まないようにする。
+                # 日付はstrptimeよりも高速なC実装のfromisoformatで解析する
                 new_requests = []
                 for date_str, priority in requests_data.items():
+                    if not isinstance(priority, int):
+                        try:
+                            priority = int(priority)
+                        except (ValueError, TypeError):
+                            continue
+
                     try:
-                        request_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                        if period.start_date <= request_date <= period.end_date:
-                            new_requests.append(
-                                ShiftRequest(
-                                    staff=staff_profile,
-                                    period=period,
-                                    date=request_date,
-                                    priority=int(priority)
-                                )
-                            )
+                        request_date = date.fromisoformat(date_str)
                     except (ValueError, TypeError):
                         continue
-                
-                # バルクインサート
-                ShiftRequest.objects.bulk_create(new_requests)
-            
+
+                    if request_date in valid_dates:
+                        new_requests.append(
+                            ShiftRequest(
+                                staff=staff_profile,
+                                period=period,
+                                date=request_date,
+                                priority=priority
+                            )
+                        )
+
+                # 全削除→再作成をやめてUPSERTで反映する
+                # （既存行はインプレース更新され、書き込み量が半減する。
+                # ON CONFLICTのターゲットはunique_together('staff','date')）
+                ShiftRequest.objects.bulk_create(
+                    new_requests,
+                    batch_size=getattr(settings, 'SHIFT_REQUEST_BULK_BATCH_SIZE', 100),
+                    update_conflicts=True,
+                    unique_fields=['staff', 'date'],
+                    update_fields=['period', 'priority'],
+                )
+
+                # 今回の提出に含まれない日付の希望だけを削除
+                # （以前の全削除と同じ最終状態を1本の小さなDELETEで保つ）
+                ShiftRequest.objects.filter(
+                    staff=staff_profile,
+                    period=period
+                ).exclude(
+                    date__in=[req.date for req in new_requests]
+                ).delete()
+
+                if action != 'auto_save':
+                    # 提出ログはコミット成立後に書く
+                    # （補助的なINSERTで本体トランザクションを
+                    # 引き延ばさず、ロールバック時にはログも残らない）
+                    log_description = f'{staff_profile.display_name}が希望を提出'
+                    transaction.on_commit(lambda: ScheduleLog.objects.create(
+                        period=period,
+                        action='request_submit',
+                        user=request.user,
+                        description=log_description,
+                        success=True
+                    ))
+
             # 自動保存かフル提出かで異なるメッセージ
             if action == 'auto_save':
                 message = '自動保存しました。'
             else:
                 message = f'希望を提出しました。（{len(new_requests)}件）'
-                
-                # 提出ログを記録
-                ScheduleLog.objects.create(
-                    period=period,
-                    action='request_submit',
-                    user=request.user,
-                    description=f'{staff_profile.display_name}が希望を提出',
-                    success=True
-                )
             
-            return JsonResponse({
+            return json_response({
                 'success': True,
                 'message': message,
                 'period_id': period_id,
                 'count': len(new_requests)
             })
-            
+
         except Exception as e:
             logger.error(f'シフト希望保存エラー: {str(e)}')
-            return JsonResponse({
+            return json_response({
                 'success': False,
                 'message': 'システムエラーが発生しました。'
             })
@@ -247,12 +334,16 @@ class HolidayBalanceView(LoginRequiredMixin, TemplateView):
         
         staff_profile = get_current_staff_profile(self.request.user)
         if staff_profile:
-            year = int(self.request.GET.get('year', datetime.now().year))
+            year = int(self.request.GET.get('year', timezone.localdate().year))
             
+            # テンプレートが使う列だけに絞って行幅を抑える
             balances = HolidayBalance.objects.filter(
                 staff=staff_profile,
                 year=year
-            ).select_related('holiday_type')
+            ).select_related('holiday_type').only(
+                'year', 'balance',
+                'holiday_type__name', 'holiday_type__color_code'
+            )
             
             context.update({
                 'balances': balances,
@@ -275,8 +366,11 @@ class AdminDashboardView(UserPassesTestMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # 利用可能な期間一覧
-        available_periods = SchedulePeriod.objects.all().order_by('-start_date')
+        # 利用可能な期間一覧（セレクタ表示用なので直近2年ぶんに絞り、
+        # 表示に使う列だけ取得する）
+        available_periods = SchedulePeriod.objects.order_by('-start_date').only(
+            'id', 'name', 'start_date', 'end_date'
+        )[:24]
         
         # 現在選択中の期間
         period_id = self.request.GET.get('period_id')
@@ -295,16 +389,34 @@ class AdminDashboardView(UserPassesTestMixin, TemplateView):
             })
             return context
         
-        # 統計情報の計算
-        stats = self._calculate_stats(current_period)
-        
+        # 統計情報の計算。ダッシュボードのリロードごとに集計クエリを
+        # 打ち直さないよう短TTLでキャッシュする。キーに期間のupdated_atを
+        # 含めることで、期間自体の変更時は自然に新キーへ切り替わり、
+        # 希望提出による変動はTTL 60秒で追従する
+        stats_key = (
+            f"dash_stats:{current_period.id}"
+            f":v{current_period.updated_at.timestamp()}"
+        )
+        stats = cache.get(stats_key)
+        if stats is None:
+            stats = self._calculate_stats(current_period)
+            cache.set(stats_key, stats, 60)
+        
+        # ログは1クエリでまとめて取り、表示用の直近10件と
+        # AI実行状況用の最新ai_createログの両方をそこから拾う
+        # （直近20件にai_createが無いほど古い実行結果は表示しない）
+        logs = list(ScheduleLog.objects.filter(
+            period=current_period
+        ).select_related('user').order_by('-created_at')[:20])
+        latest_ai_log = next(
+            (log for log in logs if log.action == 'ai_create'), None
+        )
+
         # AI実行状況の確認
-        ai_status = self._get_ai_status(current_period)
-        
+        ai_status = self._get_ai_status(latest_ai_log)
+
         # 最近のログ
-        recent_logs = ScheduleLog.objects.filter(
-            period=current_period
-        ).order_by('-created_at')[:10]
+        recent_logs = logs[:10]
         
         # アラート一覧
         alerts = self._generate_alerts(current_period, stats)
@@ -355,17 +467,18 @@ class AdminDashboardView(UserPassesTestMixin, TemplateView):
     def _calculate_stats(self, period: SchedulePeriod) -> Dict:
         """統計情報の計算"""
         total_staff = StaffProfile.objects.filter(is_active=True).count()
-        
-        # 希望提出状況
-        submitted_staff = StaffRequest.objects.filter(
+
+        # 希望提出状況（StaffRequestは存在しないモデル名で、
+        # 参照されるとNameErrorになっていた）
+        submitted_staff = ShiftRequest.objects.filter(
             period=period
-        ).values('staff').distinct().count()
-        
+        ).aggregate(submitted=Count('staff', distinct=True))['submitted']
+
         # 必要人数設定状況
-        total_days = (period.end_date - period.start_date).days + 1
+        total_days = period.days_count
         requirements_set = DailyRequirement.objects.filter(
             period=period
-        ).values('date').distinct().count()
+        ).aggregate(dates=Count('date', distinct=True))['dates']
         
         # 完成度計算
         has_requests = submitted_staff > 0
@@ -389,15 +502,15 @@ class AdminDashboardView(UserPassesTestMixin, TemplateView):
             'progress_offset': 283 - (283 * completion_rate / 100),  # SVG circle progress
         }
     
-    def _get_ai_status(self, period: SchedulePeriod) -> Dict:
-        """AI実行状況の取得"""
+    def _get_ai_status(self, latest_log) -> Dict:
+        """AI実行状況の取得
+
+        最新のai_createログはget_context_data側で取得済みのものを
+        受け取る（recent_logs用のクエリと共用するため）。
+        """
         # 実装では Celery タスクの状況をチェック
         # ここでは簡易版
-        latest_log = ScheduleLog.objects.filter(
-            period=period,
-            action='ai_create'
-        ).order_by('-created_at').first()
-        
+
         return {
             'is_running': False,  # 実際はCeleryタスク状況をチェック
             'progress': 0,
@@ -429,8 +542,10 @@ class AdminDashboardView(UserPassesTestMixin, TemplateView):
                 'message': '必要人数が設定されていません。'
             })
         
-        if period.is_request_open:
-            days_left = (period.request_deadline.date() - timezone.now().date()).days
+        # 現在時刻は1回だけ取得し、is_request_open経由の再取得を避ける
+        now = timezone.now()
+        if now <= period.request_deadline:
+            days_left = (period.request_deadline.date() - now.date()).days
             if days_left <= 1:
                 alerts.append({
                     'level': 'warning',
@@ -457,40 +572,50 @@ class ScheduleAPIView(LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         """月間スケジュールデータの取得"""
         try:
-            year = int(request.GET.get('year', datetime.now().year))
-            month = int(request.GET.get('month', datetime.now().month))
+            today = timezone.localdate()
+            year = int(request.GET.get('year', today.year))
+            month = int(request.GET.get('month', today.month))
             
             staff_profile = get_current_staff_profile(request.user)
             if not staff_profile:
-                return JsonResponse({'error': 'スタッフプロフィールが見つかりません'}, status=404)
+                return json_response({'error': 'スタッフプロフィールが見つかりません'}, status=404)
             
             # 月間のシフト割り当てを取得
             month_start = date(year, month, 1)
             month_end = date(year, month, monthrange(year, month)[1])
             
-            assignments = ShiftAssignment.objects.filter(
+            # 月間30行が同じ数行のHolidayTypeを繰り返すJOINは無駄なので、
+            # 参照キャッシュ（in_bulk辞書）からIDで引く。
+            # シリアライズにしか使わない行はモデルを生成せず
+            # values()の辞書のまま読む
+            rows = ShiftAssignment.objects.filter(
                 staff=staff_profile,
                 date__range=(month_start, month_end)
-            ).select_related('holiday_type')
-            
+            ).values(
+                'date', 'is_workday', 'holiday_type_id', 'notes',
+                'manually_adjusted', 'created_by_ai', 'updated_at'
+            )
+            holiday_types = HolidayType.cached_by_id()
+
             # JSON形式に変換
             assignments_data = {}
-            for assignment in assignments:
-                date_str = assignment.date.strftime('%Y-%m-%d')
+            for row in rows:
+                date_str = row['date'].strftime('%Y-%m-%d')
+                holiday_type = holiday_types.get(row['holiday_type_id'])
                 assignments_data[date_str] = {
-                    'isWorkday': assignment.is_workday,
-                    'holidayType': assignment.holiday_type.name if assignment.holiday_type else '',
-                    'notes': assignment.notes or '',
-                    'manuallyAdjusted': assignment.manually_adjusted,
-                    'createdByAi': assignment.created_by_ai,
-                    'updatedAt': assignment.updated_at.strftime('%Y-%m-%d %H:%M')
+                    'isWorkday': row['is_workday'],
+                    'holidayType': holiday_type.name if holiday_type else '',
+                    'notes': row['notes'] or '',
+                    'manuallyAdjusted': row['manually_adjusted'],
+                    'createdByAi': row['created_by_ai'],
+                    'updatedAt': row['updated_at'].strftime('%Y-%m-%d %H:%M')
                 }
             
             # 統計情報
             work_days = sum(1 for a in assignments_data.values() if a['isWorkday'])
             holiday_days = len(assignments_data) - work_days
             
-            return JsonResponse({
+            return json_response({
                 'success': True,
                 'assignments': assignments_data,
                 'stats': {
@@ -502,7 +627,7 @@ class ScheduleAPIView(LoginRequiredMixin, View):
             
         except Exception as e:
             logger.error(f'スケジュールAPI取得エラー: {str(e)}')
-            return JsonResponse({'error': 'データ取得エラー'}, status=500)
+            return json_response({'error': 'データ取得エラー'}, status=500)
 
 
 # --- エラーハンドリング ---